@@ -1,16 +1,34 @@
+import gzip
+import hashlib
 import logging
-from collections import OrderedDict
+import zlib
 from datetime import datetime, timedelta, timezone
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, abort, redirect, send_file, stream_with_context, url_for
 import database as db
+import sync
+import thumbnail_cache as thumbs
 import youtube_api as yt
+import json
 import os
 import urllib.parse
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET_KEY', 'dev-secret-key-replace-in-prod')
+# The interactive OAuth flow blocks the request until the browser consent finishes; wsgi.py turns it off.
+app.config.setdefault('INTERACTIVE_OAUTH', True)
+
+# Static files are served with direct_passthrough, which the compression hook skips.
+COMPRESSIBLE_MIMETYPES = {'text/html', 'application/json'}
+COMPRESSION_MIN_BYTES = 1024
+# Number of template chunks Jinja groups together before each streamed write.
+TEMPLATE_STREAM_BUFFER_SIZE = 20
 
 
 def check_authentication():
@@ -18,12 +36,147 @@ def check_authentication():
     return os.path.exists(yt.TOKEN_PICKLE_FILE)
 
 
-def group_videos_by_channel(videos):
-    grouped = OrderedDict()
+def get_youtube_service():
+    """YouTube service for the current request, or None.
+
+    Without INTERACTIVE_OAUTH only the saved token is used, so a missing or
+    unrefreshable token fails fast instead of blocking a worker in the OAuth flow.
+    """
+    if app.config['INTERACTIVE_OAUTH']:
+        return yt.get_authenticated_service()
+    return yt.get_service_from_saved_token()
+
+
+def build_etag(*parts):
+    """Weak ETag derived from the DB data version plus any view-specific inputs."""
+    raw = '|'.join(str(part) for part in (db.get_data_version(), *parts))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def not_modified(etag):
+    """Returns a 304 response if the client already holds `etag`, else None."""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+def render_template_streamed(template_name, **context):
+    """Like `render_template`, but sends the page in chunks as Jinja renders it.
+
+    Lets templates iterate lazy row generators (e.g. `db.iter_channels()`) so the
+    first bytes leave before the last row is read and the full page is never held in memory.
+    """
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(template_name).stream(context)
+    stream.enable_buffering(TEMPLATE_STREAM_BUFFER_SIZE)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+
+def _gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def with_etag(response, etag):
+    response = app.make_response(response)
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Gzip (or Brotli, when installed) large HTML and JSON bodies; static files pass through untouched."""
+    if (
+        response.status_code < 200 or response.status_code >= 300
+        or response.direct_passthrough
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    accepted = request.accept_encodings
+    if response.is_streamed:
+        # Streamed HTML pages are gzipped chunk by chunk so they still flush progressively.
+        if response.mimetype == 'text/html' and accepted['gzip']:
+            response.response = _gzip_stream(response.response)
+            response.headers['Content-Encoding'] = 'gzip'
+            response.headers.pop('Content-Length', None)
+            response.vary.add('Accept-Encoding')
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        return response
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.context_processor
+def inject_thumbnail_helpers():
+    def thumbnail_src(url):
+        if not url:
+            return url_for('static', filename='placeholder.png')
+        if thumbs.THUMBNAIL_PROXY_ENABLED:
+            return url_for('thumbnail_proxy', url=url)
+        return url
+
+    return {
+        'thumbnail_src': thumbnail_src,
+        'THUMBNAIL_PROXY_URL': url_for('thumbnail_proxy') if thumbs.THUMBNAIL_PROXY_ENABLED else ''
+    }
+
+
+FAVORITE_VIEW_TITLES = {
+    'date_desc': 'Todos los canales (más recientes primero)',
+    'date_asc': 'Todos los canales (más antiguos primero)',
+    'last_7_days': 'Todos los canales (últimos 7 días, del más viejo al más nuevo)',
+    'last_30_days': 'Todos los canales (últimos 30 días, del más viejo al más nuevo)',
+}
+
+
+def build_favorite_sections(view_mode, videos, stale_channel_ids):
+    """Splits the rows of `db.get_favorite_video_cache(view_mode)` into the sections the page shows.
+
+    The 'channel' view gets one section per channel (rows arrive grouped by the SQL);
+    every other view is a single section in the order the query returned.
+    """
+    if view_mode != 'channel':
+        return [{"title": FAVORITE_VIEW_TITLES[view_mode], "stale": False, "videos": videos}] if videos else []
+
+    stale_channel_ids = set(stale_channel_ids)
+    sections = []
     for video in videos:
-        channel_title = video.get('channel_title', 'Sin canal')
-        grouped.setdefault(channel_title, []).append(video)
-    return grouped
+        if not sections or sections[-1]['channel_id'] != video['channel_id']:
+            sections.append({
+                "title": video.get('channel_title') or 'Sin canal',
+                "channel_id": video['channel_id'],
+                "stale": video['channel_id'] in stale_channel_ids,
+                "videos": []
+            })
+        sections[-1]['videos'].append(video)
+    return sections
+
+
+def parse_view_mode(value):
+    return value if value in db.FAVORITE_VIEW_MODES else 'channel'
 
 
 
@@ -34,231 +187,482 @@ def index():
     user_channel_title = None
     service = None
 
+    etag = build_etag('index', thumbs.THUMBNAIL_PROXY_ENABLED)
+    if check_authentication():
+        cached_response = not_modified(etag)
+        if cached_response:
+            return cached_response
+
     if not check_authentication():
         logging.info("No token file found, attempting authentication...")
-        service = yt.get_authenticated_service()
+        service = get_youtube_service()
         if not service:
             return "Authentication required or failed. Please ensure you have 'client_secrets.json', necessary permissions, and run the app again to authorize.", 401
         logging.info("Authentication successful, proceeding.")
     else:
-        service = yt.get_authenticated_service()
+        service = get_youtube_service()
         if not service:
             logging.warning("Token found but failed to build service. Authentication might be needed.")
+            if not app.config['INTERACTIVE_OAUTH']:
+                return "Authorization required: the saved token is missing or could not be refreshed. Authorize again with 'flask run'.", 401
             return "Error connecting to YouTube service. Please try deleting token.pickle and restarting.", 500
 
     if service:
         user_channel_title = yt.get_my_channel_info(service)
 
-    channels = db.get_all_channels()
+    channel_count = db.get_channel_count()
     unique_tags = db.get_unique_tags()
     tag_colors = db.get_tag_colors()
     favorites_new_count = db.get_favorite_video_cache_count()
 
-    if not channels and service and user_channel_title is not None:
+    if not channel_count and service and user_channel_title is not None:
         logging.info("Database is empty. Fetching subscriptions from YouTube API...")
-        yt_subscriptions = yt.get_all_subscriptions(service)
-        if yt_subscriptions:
-            logging.info(f"Adding {len(yt_subscriptions)} channels to the database.")
-            for sub in yt_subscriptions:
-                db.add_or_update_channel(
-                    sub['channel_id'],
-                    sub['title'],
-                    sub['thumbnail_url']
-                )
-            channels = db.get_all_channels()
-            unique_tags = db.get_unique_tags()
-        elif yt_subscriptions is None:
+        result = sync.run_subscription_sync(service)
+        if result['event'] == 'error':
             logging.error("Failed to fetch subscriptions from YouTube API during initial load.")
             return yt.build_user_facing_error_message(
                 "Error fetching subscriptions from YouTube. Please check API status or quotas.",
                 error_context='subscriptions'
             ), 500
+        if result['event'] == 'busy':
+            logging.info("Initial import already running in another worker.")
+        elif result['fetched']:
+            logging.info(f"Added {result['fetched']} channels to the database.")
+            channel_count = db.get_channel_count()
+            unique_tags = db.get_unique_tags()
         else:
             logging.warning("Fetched no subscriptions from YouTube API during initial load.")
 
-    return render_template(
+    return with_etag(render_template_streamed(
         'index.html',
-        channels=channels,
+        channels=db.iter_channels(),
+        channel_count=channel_count,
         unique_tags=unique_tags,
+        tag_facets=db.get_tag_facets(),
         tag_colors=tag_colors,
         DEFAULT_TAG_COLOR=db.DEFAULT_TAG_COLOR,
         user_channel_title=user_channel_title,
         favorites_new_count=favorites_new_count
-    )
+    ), build_etag('index', thumbs.THUMBNAIL_PROXY_ENABLED))
 
 
 @app.route('/nuevos-favoritos')
 def favorites_new_videos():
-    view_mode = request.args.get('view', 'channel')
-    valid_view_modes = {'channel', 'date_desc', 'date_asc', 'last_7_days', 'last_30_days'}
-    if view_mode not in valid_view_modes:
-        view_mode = 'channel'
+    view_mode = parse_view_mode(request.args.get('view'))
 
-    service = yt.get_authenticated_service()
+    service = get_youtube_service()
     if not service:
         return "Authentication required or failed for video fetch.", 401
 
-    favorite_channels = db.get_favorite_channels(min_rating=4)
+    favorite_channels = db.get_favorite_channels(min_rating=db.FAVORITE_MIN_RATING)
     last_check = db.get_last_favorites_check()
 
     if not favorite_channels:
         return render_template(
             'favorites_new.html',
-            videos_by_channel=OrderedDict(),
+            sections=[],
             total_new_videos=0,
             total_channels=0,
             warning_message=None,
             last_check=last_check,
             used_cache=False,
+            stale_channel_ids=[],
+            stream_url=None,
             view_mode=view_mode
         )
 
-    fetched_videos = []
+    retry_stale_only = request.args.get('retry_stale') == '1'
+    # ?force=1 polls every favorite channel, ignoring the adaptive polling schedule.
+    force_full_check = request.args.get('force') == '1'
+    # Streaming mode renders the cache right away; favorites_new.js then patches in
+    # fresh results from /nuevos-favoritos/stream. ?stream=0 refreshes before rendering.
+    stream_mode = request.args.get('stream', '1') != '0'
     warning_message = None
     used_cache = False
-
-    for channel in favorite_channels:
-        channel_videos = yt.get_new_videos_for_channel(
-            service,
-            channel_id=channel['channel_id'],
-            channel_title=channel['title'],
-            published_after=last_check,
-            max_pages=3
+    stream_url = None
+
+    if stream_mode:
+        stale_channel_ids = db.get_stale_favorite_channel_ids()
+        stream_url = url_for(
+            'favorites_new_videos_stream',
+            retry_stale=1 if retry_stale_only else None,
+            force=1 if force_full_check else None
         )
-        if channel_videos is None:
-            warning_message = yt.build_user_facing_error_message(
-                "No se pudieron actualizar los videos en vivo de YouTube. "
-                "Mostrando el último resultado cacheado.",
-                error_context='favorite_videos'
-            )
-            used_cache = True
-            break
-        fetched_videos.extend(channel_videos)
-
-    if used_cache:
-        videos = db.get_favorite_video_cache()
     else:
-        videos = sorted(
-            fetched_videos,
-            key=lambda video: (video.get('channel_title', '').lower(), video.get('published_at', '')),
-            reverse=False
+        result = sync.run_favorites_refresh(
+            service, retry_stale_only=retry_stale_only, force_full_check=force_full_check
         )
-        db.replace_favorite_video_cache(videos)
-        db.set_last_favorites_check(yt.utc_now_iso())
+        if result['event'] == 'busy':
+            warning_message = result['message']
+            used_cache = True
+            stale_channel_ids = db.get_stale_favorite_channel_ids()
+        else:
+            warning_message = result['warning_message']
+            used_cache = bool(result['failed_channel_ids'])
+            stale_channel_ids = result['stale_channel_ids']
+
+    since = db.favorite_view_window_start(view_mode)
+    etag = build_etag(
+        'favorites', view_mode, since, stream_mode, last_check, warning_message, stale_channel_ids,
+        thumbs.THUMBNAIL_PROXY_ENABLED
+    )
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
 
-    videos_by_channel = group_videos_by_channel(videos)
-    total_channels = len(videos_by_channel)
-    total_new_videos = len(videos)
+    videos = db.get_favorite_video_cache(view_mode, since=since)
 
-    return render_template(
+    return with_etag(render_template(
         'favorites_new.html',
-        videos_by_channel=videos_by_channel,
-        total_new_videos=total_new_videos,
-        total_channels=total_channels,
+        sections=build_favorite_sections(view_mode, videos, stale_channel_ids),
+        total_new_videos=len(videos),
+        total_channels=len({video['channel_id'] for video in videos}),
         warning_message=warning_message,
         last_check=last_check,
         used_cache=used_cache,
+        stale_channel_ids=stale_channel_ids,
+        stream_url=stream_url,
         view_mode=view_mode
-    )
+    ), etag)
+
+
+@app.route('/nuevos-favoritos/videos')
+def favorites_new_videos_view():
+    """JSON sections for one view mode (?view=), queried from the cache; used by favorites_new.js."""
+    view_mode = parse_view_mode(request.args.get('view'))
+    since = db.favorite_view_window_start(view_mode)
+    stale_channel_ids = db.get_stale_favorite_channel_ids()
+    etag = build_etag('favorites_view', view_mode, since, stale_channel_ids)
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
+
+    videos = db.get_favorite_video_cache(view_mode, since=since)
+    return with_etag(jsonify({
+        "success": True,
+        "view_mode": view_mode,
+        "sections": build_favorite_sections(view_mode, videos, stale_channel_ids),
+        "total_new_videos": len(videos),
+        "total_channels": len({video['channel_id'] for video in videos}),
+        "stale_channel_ids": stale_channel_ids
+    }), etag)
+
+
+@app.route('/nuevos-favoritos/stream')
+def favorites_new_videos_stream():
+    """Server-sent events: one `channel` event per favorite channel as soon as it is fetched, then `done`."""
+    service = get_youtube_service()
+    if not service:
+        return jsonify({"success": False, "message": "Authentication required or failed for video fetch."}), 401
+
+    retry_stale_only = request.args.get('retry_stale') == '1'
+    force_full_check = request.args.get('force') == '1'
+
+    def generate():
+        for event in sync.iter_favorites_refresh(
+            service, retry_stale_only=retry_stale_only, force_full_check=force_full_check
+        ):
+            yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def build_refresh_payload(result):
+    """Final refresh response: sync summary plus the data the client needs to repaint."""
+    return {
+        "success": True,
+        "message": f"Refresh complete. Found {result['fetched']} subs. New {result['added']}. Removed {result['removed']}. Processed {result['fetched']}.",
+        "channels": db.get_all_channels(),
+        "unique_tags": db.get_unique_tags(),
+        "tag_facets": db.get_tag_facets(),
+        "tag_colors": db.get_tag_colors(),
+        "new_channel_ids": result['new_channel_ids']
+    }
 
 
 @app.route('/refresh_from_youtube', methods=['POST'])
 def refresh_from_youtube():
     """Fetches latest subscriptions, adds new ones, updates existing, and REMOVES unsubscribed."""
     logging.info("Attempting to refresh subscriptions from YouTube API...")
-    service = yt.get_authenticated_service()
+    service = get_youtube_service()
     if not service:
         return jsonify({"success": False, "message": "Authentication failed or required."}), 401
 
-    yt_subscriptions = yt.get_all_subscriptions(service)
-    if yt_subscriptions is None:
-        api_error = yt.get_last_api_error() or {}
+    result = sync.run_subscription_sync(service)
+    if result['event'] == 'busy':
+        return jsonify({"success": False, "message": result['message']}), 409
+    if result['event'] == 'error':
         return jsonify({
             "success": False,
-            "message": yt.build_user_facing_error_message(
-                "Failed to fetch subscriptions from YouTube API.",
-                error_context='subscriptions'
-            ),
-            "error_reason": api_error.get('reason'),
-            "error_status": api_error.get('status')
+            "message": result['message'],
+            "error_reason": result.get('error_reason'),
+            "error_status": result.get('error_status')
         }), 500
 
-    logging.info(f"Fetched {len(yt_subscriptions)} channels from YouTube. Comparing with database...")
-    api_channel_ids = {sub['channel_id'] for sub in yt_subscriptions}
-    db_channel_ids = db.get_all_channel_ids()
-
-    ids_to_delete = db_channel_ids - api_channel_ids
-    new_channel_ids = list(api_channel_ids - db_channel_ids)
-    if ids_to_delete:
-        logging.info(f"Found {len(ids_to_delete)} channels to remove from local DB.")
-        deleted_count = 0
-        for channel_id in ids_to_delete:
-            if db.delete_channel(channel_id):
-                deleted_count += 1
-        logging.info(f"Successfully removed {deleted_count} channels.")
-    else:
-        logging.info("No channels found to remove from local DB.")
-
-    added_updated_count = 0
-    logging.info("Adding new subscriptions and updating existing ones...")
-    for sub in yt_subscriptions:
-        db.add_or_update_channel(
-            sub['channel_id'],
-            sub['title'],
-            sub['thumbnail_url']
-        )
-        added_updated_count += 1
-    logging.info(f"Processed {added_updated_count} channels for add/update.")
+    return with_etag(jsonify(build_refresh_payload(result)), build_etag('refresh'))
+
+
+@app.route('/refresh_from_youtube/stream', methods=['POST'])
+def refresh_from_youtube_stream():
+    """Same as `refresh_from_youtube`, but streams NDJSON progress events while pages are stored.
+
+    The last line is the full refresh payload (`"event": "done"`) or an error (`"event": "error"`).
+    """
+    logging.info("Attempting streaming refresh of subscriptions from YouTube API...")
+    service = get_youtube_service()
+    if not service:
+        return jsonify({"success": False, "message": "Authentication failed or required."}), 401
+
+    def generate():
+        for event in sync.iter_subscription_sync(service):
+            if event['event'] == 'done':
+                event = {"event": "done", **build_refresh_payload(event)}
+            elif event['event'] in ('error', 'busy'):
+                event = {"success": False, **event}
+            yield json.dumps(event) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@app.route('/thumbnail')
+def thumbnail_proxy():
+    """Serves a channel/video thumbnail from the local disk cache, fetching it on first use."""
+    if not thumbs.THUMBNAIL_PROXY_ENABLED:
+        abort(404)
+
+    url = request.args.get('url', '')
+    if not url:
+        abort(400)
+
+    cached = thumbs.get_cached_thumbnail(url)
+    if not cached:
+        # Only proxy URLs we stored ourselves, so this can't be used as an open proxy.
+        if not db.is_known_thumbnail_url(url):
+            abort(404)
+        cached = thumbs.fetch_thumbnail(url)
+        if not cached:
+            return redirect(url)
+
+    path, content_type, key = cached
+    response = send_file(
+        path,
+        mimetype=content_type,
+        etag=key,
+        max_age=thumbs.THUMBNAIL_MAX_AGE_SECONDS,
+        conditional=True
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
-    logging.info("Database update complete after refresh.")
 
-    updated_channels = db.get_all_channels()
-    updated_tags = db.get_unique_tags()
-    updated_colors = db.get_tag_colors()
+def get_json_object():
+    """The request's JSON body if it is an object, otherwise None."""
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
+
+
+def parse_tags_input(value):
+    """Accepts a comma-separated string or a list of tags and returns the non-empty, stripped tags.
+
+    None means no tags; raises ValueError for any other type.
+    """
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list):
+        raise ValueError("Tags must be a string or a list.")
+    return [tag.strip() for tag in value if isinstance(tag, str) and tag.strip()]
+
+
+def parse_rating_value(value):
+    """Returns the rating as int 1-5 or None; raises ValueError for anything else."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError("Rating must be an integer.")
+    try:
+        rating_value = int(value)
+    except (ValueError, TypeError):
+        raise ValueError("Rating must be an integer.")
+    if not 1 <= rating_value <= 5:
+        raise ValueError("Rating must be between 1 and 5.")
+    return rating_value
+
+
+def parse_channel_ids(data):
+    channel_ids = data.get('channel_ids') if isinstance(data, dict) else None
+    if not isinstance(channel_ids, list) or not all(isinstance(cid, str) for cid in channel_ids):
+        return None
+    return channel_ids
+
+
+@app.route('/api/tags/bulk', methods=['POST'])
+def bulk_update_tags():
+    """Adds/removes tags on many channels at once: {"channel_ids": [...], "add": "a, b", "remove": [...]}"""
+    data = get_json_object()
+    channel_ids = parse_channel_ids(data)
+    if channel_ids is None:
+        return jsonify({"success": False, "message": "Missing or invalid 'channel_ids' list in request data."}), 400
+
+    try:
+        add_tags = parse_tags_input(data.get('add'))
+        remove_tags = parse_tags_input(data.get('remove'))
+    except ValueError:
+        return jsonify({"success": False, "message": "'add' and 'remove' must be a string or a list of tags."}), 400
+    if not add_tags and not remove_tags:
+        return jsonify({"success": False, "message": "Nothing to do: provide 'add' and/or 'remove' tags."}), 400
+
+    updated = db.bulk_update_channel_tags(channel_ids, add_tags=add_tags, remove_tags=remove_tags)
+    if updated is None:
+        return jsonify({"success": False, "message": "Failed to update tags in database."}), 500
+
+    return jsonify({
+        "success": True,
+        "tags_by_channel": updated,
+        "not_found": [cid for cid in channel_ids if cid not in updated],
+        "unique_tags": db.get_unique_tags(),
+        "tag_facets": db.get_tag_facets(),
+        "tag_colors": db.get_tag_colors()
+    })
+
+
+@app.route('/api/tags/facets')
+def tag_facets():
+    """Channel counts per tag, untagged and per rating bucket (maintained on write in `tag_stats`)."""
+    etag = build_etag('tag_facets')
+    cached_response = not_modified(etag)
+    if cached_response:
+        return cached_response
+    return with_etag(jsonify({"success": True, **db.get_tag_facets()}), etag)
+
+
+def tag_catalog_response(changed_count):
     return jsonify({
         "success": True,
-        "message": f"Refresh complete. Found {len(yt_subscriptions)} subs. New {len(new_channel_ids)}. Removed {len(ids_to_delete)}. Processed {added_updated_count}.",
-        "channels": updated_channels,
-        "unique_tags": updated_tags,
-        "tag_colors": updated_colors,
-        "new_channel_ids": new_channel_ids
+        "changed_channels": changed_count,
+        "unique_tags": db.get_unique_tags(),
+        "tag_facets": db.get_tag_facets(),
+        "tag_colors": db.get_tag_colors()
+    })
+
+
+@app.route('/api/tags/rename', methods=['POST'])
+def rename_tag():
+    """Renames a tag on every channel: {"from": "tech", "to": "technology"} (merges if "to" exists)."""
+    data = get_json_object() or {}
+    old_tag = str(data.get('from') or '').strip()
+    new_tag = str(data.get('to') or '').strip()
+    if not old_tag or not new_tag:
+        return jsonify({"success": False, "message": "Missing 'from' or 'to' tag in request data."}), 400
+
+    changed = db.rename_tag(old_tag, new_tag)
+    if changed is None:
+        return jsonify({"success": False, "message": "Failed to rename tag in database."}), 500
+    return tag_catalog_response(changed)
+
+
+@app.route('/api/tags/merge', methods=['POST'])
+def merge_tags():
+    """Merges several tags into one: {"sources": ["tech", "tecnología"], "target": "technology"}"""
+    data = get_json_object() or {}
+    try:
+        sources = parse_tags_input(data.get('sources'))
+    except ValueError:
+        return jsonify({"success": False, "message": "'sources' must be a string or a list of tags."}), 400
+    target = str(data.get('target') or '').strip()
+    if not sources or not target:
+        return jsonify({"success": False, "message": "Missing 'sources' or 'target' in request data."}), 400
+
+    changed = db.merge_tags(sources, target)
+    if changed is None:
+        return jsonify({"success": False, "message": "Failed to merge tags in database."}), 500
+    return tag_catalog_response(changed)
+
+
+@app.route('/api/tags/delete', methods=['POST'])
+def delete_tag():
+    """Removes a tag from every channel: {"tag": "old"}"""
+    data = get_json_object() or {}
+    tag = str(data.get('tag') or '').strip()
+    if not tag:
+        return jsonify({"success": False, "message": "Missing 'tag' in request data."}), 400
+
+    changed = db.delete_tag(tag)
+    if changed is None:
+        return jsonify({"success": False, "message": "Failed to delete tag in database."}), 500
+    return tag_catalog_response(changed)
+
+
+@app.route('/api/rating/bulk', methods=['POST'])
+def bulk_update_rating():
+    """Sets one rating on many channels at once: {"channel_ids": [...], "rating": 1..5 | null}"""
+    data = get_json_object()
+    channel_ids = parse_channel_ids(data)
+    if channel_ids is None or 'rating' not in data:
+        return jsonify({"success": False, "message": "Missing 'channel_ids' list or 'rating' in request data."}), 400
+
+    try:
+        rating_value = parse_rating_value(data['rating'])
+    except ValueError:
+        return jsonify({"success": False, "message": "Invalid rating value. Must be an integer between 1 and 5, or null."}), 400
+
+    found = db.bulk_update_channel_rating(channel_ids, rating_value)
+    if found is None:
+        return jsonify({"success": False, "message": "Failed to update ratings in database."}), 500
+
+    return jsonify({
+        "success": True,
+        "rating": rating_value,
+        "updated_count": found,
+        "tag_facets": db.get_tag_facets()
     })
 
 
 @app.route('/api/tags/<channel_id>', methods=['POST'])
 def update_tags(channel_id):
-    data = request.get_json()
+    data = get_json_object()
     if not data or 'tags' not in data:
         return jsonify({"success": False, "message": "Missing 'tags' in request data."}), 400
 
-    tags_string = data['tags']
-    tags_list = [tag.strip() for tag in tags_string.split(',') if tag.strip()]
+    try:
+        tags_list = parse_tags_input(data['tags'])
+    except ValueError:
+        return jsonify({"success": False, "message": "'tags' must be a string or a list of tags."}), 400
     success = db.update_channel_tags(channel_id, tags_list)
 
     if success:
-        updated_channel_data = next((c for c in db.get_all_channels() if c['channel_id'] == channel_id), None)
+        updated_channel_data = db.get_channel(channel_id)
         current_tags = updated_channel_data.get('tags', []) if updated_channel_data else []
         unique_tags = db.get_unique_tags()
         tag_colors = db.get_tag_colors()
-        return jsonify({
+        return with_etag(jsonify({
             "success": True,
             "channel_id": channel_id,
             "tags": current_tags,
             "unique_tags": unique_tags,
+            "tag_facets": db.get_tag_facets(),
             "tag_colors": tag_colors
-        })
+        }), build_etag('tags', channel_id))
 
     return jsonify({"success": False, "message": "Failed to update tags in database."}), 500
 
 
 @app.route('/api/tags/color/<tag_name>', methods=['POST'])
 def update_tag_color(tag_name):
-    data = request.get_json()
+    data = get_json_object()
     if not data or 'color' not in data:
         return jsonify({"success": False, "message": "Missing 'color' in request data."}), 400
 
     color = data['color']
-    if not (color.startswith('#') and (len(color) == 7 or len(color) == 4)):
+    if not (isinstance(color, str) and color.startswith('#') and (len(color) == 7 or len(color) == 4)):
         return jsonify({"success": False, "message": "Invalid color format (expecting #rrggbb or #rgb)."}), 400
 
     decoded_tag_name = urllib.parse.unquote(tag_name)
@@ -278,29 +682,26 @@ def update_tag_color(tag_name):
 
 @app.route('/api/rating/<channel_id>', methods=['POST'])
 def update_rating(channel_id):
-    data = request.get_json()
+    data = get_json_object()
     if not data or 'rating' not in data:
         return jsonify({"success": False, "message": "Missing 'rating' in request data."}), 400
 
     try:
-        rating_value = data['rating']
-        if rating_value is not None:
-            rating_value = int(rating_value)
-            if not 1 <= rating_value <= 5:
-                raise ValueError("Rating must be between 1 and 5.")
-    except (ValueError, TypeError):
+        rating_value = parse_rating_value(data['rating'])
+    except ValueError:
         return jsonify({"success": False, "message": "Invalid rating value. Must be an integer between 1 and 5, or null."}), 400
 
     success = db.update_channel_rating(channel_id, rating_value)
 
     if success:
         updated_channels = db.get_all_channels()
-        return jsonify({
+        return with_etag(jsonify({
             "success": True,
             "channel_id": channel_id,
             "rating": rating_value,
-            "channels": updated_channels
-        })
+            "channels": updated_channels,
+            "tag_facets": db.get_tag_facets()
+        }), build_etag('rating', channel_id))
 
     return jsonify({"success": False, "message": "Failed to update rating in database."}), 500
 
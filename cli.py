@@ -0,0 +1,240 @@
+"""Command-line maintenance tasks that run without the web server.
+
+    python cli.py export [-o backup.ndjson[.gz]]
+    python cli.py import backup.ndjson[.gz]
+    python cli.py sync [--dry-run]
+    python cli.py favorites [--dry-run] [--retry-stale] [--force] [--backend api|feed] [--min-rating N]
+    python cli.py refresh [--dry-run]          # sync, then favorites
+    python cli.py vacuum                       # full VACUUM (blocks writers while it runs)
+
+Job commands print one JSON line per job (status, timings, API calls, quota
+units) and exit non-zero if any job failed, even partway.
+"""
+import argparse
+import gzip
+import json
+import logging
+import sqlite3
+import sys
+import time
+
+import database as db
+import sync
+import youtube_api as yt
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_PARTIAL = 2
+EXIT_BUSY = 3
+
+
+def _open_text(path, mode):
+    if path == '-':
+        return sys.stdout if 'w' in mode else sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class _NdjsonReader:
+    """Iterates the JSON objects of an NDJSON stream, remembering the line of the last one."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.line_number = 0
+
+    def __iter__(self):
+        for self.line_number, line in enumerate(self.stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"invalid JSON ({e.msg}).")
+
+
+def export_command(args):
+    out = _open_text(args.output, 'w')
+    counts = {}
+    try:
+        header = {
+            'type': 'meta',
+            'format': db.EXPORT_FORMAT,
+            'version': db.EXPORT_FORMAT_VERSION,
+            'exported_at': yt.utc_now_iso()
+        }
+        out.write(json.dumps(header) + '\n')
+        for record in db.iter_export_records():
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+            counts[record['type']] = counts.get(record['type'], 0) + 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    logging.info(f"Export complete: {counts}")
+    return 0
+
+
+def import_command(args):
+    stream = _open_text(args.input, 'r')
+    reader = _NdjsonReader(stream)
+    try:
+        records = iter(reader)
+        header = next(records, None)
+        if not isinstance(header, dict) or header.get('type') != 'meta' or header.get('format') != db.EXPORT_FORMAT:
+            logging.error("Not a youtube-subscription-tagger export (missing meta header).")
+            return 1
+        version = header.get('version', 0)
+        if isinstance(version, bool) or not isinstance(version, int):
+            logging.error(f"Invalid export format version {version!r}.")
+            return 1
+        if version > db.EXPORT_FORMAT_VERSION:
+            logging.error(f"Export format version {version} is newer than supported ({db.EXPORT_FORMAT_VERSION}).")
+            return 1
+        counts = db.import_records(records, batch_size=args.batch_size)
+    except ValueError as e:
+        logging.error(f"Import failed at line {reader.line_number}, nothing was written: {e}")
+        return 1
+    except sqlite3.Error as e:
+        logging.error(f"Import failed, nothing was written: {e}")
+        return 1
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(json.dumps({'imported': counts}))
+    return 0
+
+
+def vacuum_command(args):
+    return 0 if db.vacuum_database() else 1
+
+
+def _run_job(job_name, run, dry_run):
+    """Runs one job, prints its JSON report and returns the job's exit code."""
+    usage_before = yt.get_api_usage()
+    started_at = yt.utc_now_iso()
+    started = time.monotonic()
+    result = run()
+    duration = time.monotonic() - started
+    usage_after = yt.get_api_usage()
+
+    event = result.get('event')
+    if event == 'busy':
+        status, exit_code = 'busy', EXIT_BUSY
+    elif event == 'error':
+        status, exit_code = 'failed', EXIT_FAILED
+    elif result.get('failed_channel_ids'):
+        status, exit_code = 'partial', EXIT_PARTIAL
+    else:
+        status, exit_code = 'ok', EXIT_OK
+
+    by_method = {
+        method: count - usage_before['by_method'].get(method, 0)
+        for method, count in usage_after['by_method'].items()
+        if count != usage_before['by_method'].get(method, 0)
+    }
+    report = {
+        'job': job_name,
+        'status': status,
+        'dry_run': dry_run,
+        'started_at': started_at,
+        'duration_seconds': round(duration, 3),
+        'api': {
+            'calls': usage_after['calls'] - usage_before['calls'],
+            'retries': usage_after['retries'] - usage_before['retries'],
+            'quota_units': usage_after['quota_units'] - usage_before['quota_units'],
+            'by_method': by_method
+        },
+        'result': {key: value for key, value in result.items() if key != 'event'}
+    }
+    print(json.dumps(report, ensure_ascii=False), flush=True)
+    return exit_code
+
+
+def _run_favorites(service, args):
+    options = {'retry_stale_only': args.retry_stale, 'min_rating': args.min_rating, 'force_full_check': args.force}
+    if args.dry_run:
+        return sync.plan_favorites_refresh(**options)
+    result = None
+    new_videos = 0
+    for result in sync.iter_favorites_refresh(service, backend=args.backend, **options):
+        new_videos += len(result.get('videos') or ()) if result.get('event') == 'channel' else 0
+    if result.get('event') == 'done':
+        result['new_videos'] = new_videos
+    return result
+
+
+def _run_sync(service, args):
+    if args.dry_run:
+        return sync.plan_subscription_sync(service)
+    return sync.run_subscription_sync(service)
+
+
+def jobs_command(args):
+    db.init_db()
+    # Favorites dry runs only read the local database, so they work without a token.
+    needs_service = args.command != 'favorites' or not args.dry_run
+    service = sync.get_headless_service() if needs_service else None
+    if needs_service and not service:
+        print(json.dumps({'job': args.command, 'status': 'failed', 'result': {'message': "YouTube service unavailable."}}))
+        return EXIT_FAILED
+
+    jobs = {
+        'sync': [('subscription_sync', _run_sync)],
+        'favorites': [('favorites_refresh', _run_favorites)],
+        'refresh': [('subscription_sync', _run_sync), ('favorites_refresh', _run_favorites)],
+    }[args.command]
+    exit_code = EXIT_OK
+    for job_name, run in jobs:
+        exit_code = max(exit_code, _run_job(job_name, lambda: run(service, args), args.dry_run))
+    return exit_code
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="YouTube Subscription Tagger command-line tasks.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help="Stream the local database to NDJSON (.gz to compress).")
+    export_parser.add_argument('-o', '--output', default='-', help="Output file, '-' for stdout (default).")
+    export_parser.set_defaults(func=export_command)
+
+    import_parser = subparsers.add_parser('import', help="Upsert an NDJSON export into the local database.")
+    import_parser.add_argument('input', help="Export file, '-' for stdin.")
+    import_parser.add_argument('--batch-size', type=int, default=1000, help="Rows per executemany batch.")
+    import_parser.set_defaults(func=import_command)
+
+    vacuum_parser = subparsers.add_parser('vacuum', help="Rewrite the database file and enable incremental vacuum.")
+    vacuum_parser.set_defaults(func=vacuum_command)
+
+    job_help = {
+        'sync': "Sync subscriptions from YouTube (dry run: fetch and diff only).",
+        'favorites': "Refresh new videos of favorite channels (dry run: list channels to poll, no API calls).",
+        'refresh': "Run 'sync' and then 'favorites'.",
+    }
+    for command, help_text in job_help.items():
+        job_parser = subparsers.add_parser(command, help=help_text)
+        job_parser.add_argument('--dry-run', action='store_true', help="Don't write to the database.")
+        if command != 'sync':
+            job_parser.add_argument('--retry-stale', action='store_true', help="Only retry channels whose last fetch failed.")
+            job_parser.add_argument(
+                '--min-rating', type=int, default=db.FAVORITE_MIN_RATING,
+                help=f"Only poll channels rated at least N (default {db.FAVORITE_MIN_RATING}); a higher N leaves "
+                     "the other favorites' cache and schedule untouched."
+            )
+            job_parser.add_argument('--force', action='store_true', help="Poll every favorite channel, ignoring the adaptive schedule.")
+            job_parser.add_argument(
+                '--backend', choices=sorted(sync.DISCOVERY_BACKENDS),
+                help=f"New-video discovery backend (default: FAVORITES_DISCOVERY_BACKEND, now '{sync.FAVORITES_DISCOVERY_BACKEND}')."
+            )
+        job_parser.set_defaults(func=jobs_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
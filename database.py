@@ -2,9 +2,36 @@ import sqlite3
 import logging
 import json
 import os
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
 
 DATABASE_NAME = 'subscriptions.db'
 DEFAULT_TAG_COLOR = '#cccccc'
+# Several WSGI workers share the same file: wait for locks instead of failing immediately.
+SQLITE_BUSY_TIMEOUT_SECONDS = 30
+# Channels rated at least this are the app's favorites (/nuevos-favoritos, the background refresher).
+FAVORITE_MIN_RATING = 4
+# favorite_video_cache retention (0 disables a limit), enforced after every favorites refresh.
+FAVORITE_CACHE_MAX_AGE_DAYS = int(os.environ.get('FAVORITE_CACHE_MAX_AGE_DAYS', 90))
+FAVORITE_CACHE_MAX_PER_CHANNEL = int(os.environ.get('FAVORITE_CACHE_MAX_PER_CHANNEL', 200))
+FAVORITE_CACHE_MAX_ROWS = int(os.environ.get('FAVORITE_CACHE_MAX_ROWS', 5000))
+# /nuevos-favoritos view modes: date windows (days) and row caps applied in SQL.
+FAVORITE_VIEW_WINDOW_DAYS = {'last_7_days': 7, 'last_30_days': 30}
+FAVORITE_VIEW_MODES = ('channel', 'date_desc', 'date_asc', *FAVORITE_VIEW_WINDOW_DAYS)
+FAVORITE_VIEW_MAX_PER_CHANNEL = int(os.environ.get('FAVORITE_VIEW_MAX_PER_CHANNEL', 50))
+FAVORITE_VIEW_MAX_ROWS = int(os.environ.get('FAVORITE_VIEW_MAX_ROWS', 1000))
+# Reclaim file space once this many pages (4 KiB each by default) are free, at most
+# VACUUM_INCREMENTAL_MAX_PAGES per call so a refresh never stalls on a large freelist.
+VACUUM_MIN_FREE_PAGES = 1024
+VACUUM_INCREMENTAL_MAX_PAGES = 4096
+# Tables whose writes change what the pages render; a transaction that changes any of their
+# rows bumps `data_version` once, on commit (see _commit). Writes made outside this module don't.
+VERSIONED_TABLES = ('channels', 'tag_colors', 'favorite_video_cache')
+_BUMP_DATA_VERSION_SQL = "UPDATE app_state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'data_version'"
+# channels.tags as a JSON array, tolerating NULL or malformed values like _decode_tags does.
+_SAFE_TAGS_SQL = "CASE WHEN NOT json_valid({tags}) THEN '[]' WHEN json_type({tags}) = 'array' THEN {tags} ELSE '[]' END"
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -12,7 +39,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 def get_db_connection():
     """Establishes a connection to the SQLite database."""
     try:
-        conn = sqlite3.connect(DATABASE_NAME)
+        conn = sqlite3.connect(DATABASE_NAME, timeout=SQLITE_BUSY_TIMEOUT_SECONDS)
         conn.row_factory = sqlite3.Row
         return conn
     except sqlite3.Error as e:
@@ -26,6 +53,10 @@ def init_db():
     if conn:
         try:
             cursor = conn.cursor()
+            # WAL lets readers in other workers proceed while one worker writes.
+            # Only takes effect on a new file; existing files are converted by vacuum_database().
+            cursor.execute('PRAGMA auto_vacuum=INCREMENTAL')
+            cursor.execute('PRAGMA journal_mode=WAL')
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS channels (
                     channel_id TEXT PRIMARY KEY,
@@ -60,6 +91,59 @@ def init_db():
                 )
             ''')
 
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS favorite_channel_state (
+                    channel_id TEXT PRIMARY KEY,
+                    last_checked_at TEXT,
+                    is_stale INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    next_check_at TEXT,
+                    upload_history TEXT DEFAULT '[]'
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_leases (
+                    job_name TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS subscription_sync_seen (
+                    channel_id TEXT PRIMARY KEY
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS video_details (
+                    video_id TEXT PRIMARY KEY,
+                    duration_iso TEXT,
+                    duration_text TEXT,
+                    live_broadcast_content TEXT,
+                    fetched_at TEXT NOT NULL
+                )
+            ''')
+            cursor.execute('DROP INDEX IF EXISTS idx_favorite_video_cache_channel')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_favorite_video_cache_channel_published
+                ON favorite_video_cache (channel_id, published_at)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_favorite_video_cache_published
+                ON favorite_video_cache (published_at)
+            ''')
+            # The thumbnail proxy only serves URLs stored here (is_known_thumbnail_url).
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_channels_thumbnail_url ON channels (thumbnail_url)')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_favorite_video_cache_thumbnail_url
+                ON favorite_video_cache (thumbnail_url)
+            ''')
+
+            cursor.execute("INSERT OR IGNORE INTO app_state (key, value) VALUES ('data_version', '0')")
+            # Per-row bump triggers from older versions cost one extra write per row on bulk writes.
+            for table in VERSIONED_TABLES:
+                for event in ('insert', 'update', 'delete'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS bump_data_version_{table}_{event}')
+
             # Check and add rating column if it doesn't exist (for migrations)
             try:
                 cursor.execute("SELECT rating FROM channels LIMIT 1")
@@ -74,6 +158,16 @@ def init_db():
                 logging.info("Adding 'duration_text' column to existing 'favorite_video_cache' table.")
                 cursor.execute("ALTER TABLE favorite_video_cache ADD COLUMN duration_text TEXT")
 
+            # Migration for adaptive polling columns in favorite_channel_state
+            try:
+                cursor.execute("SELECT next_check_at, upload_history FROM favorite_channel_state LIMIT 1")
+            except sqlite3.OperationalError:
+                logging.info("Adding adaptive polling columns to 'favorite_channel_state' table.")
+                cursor.execute("ALTER TABLE favorite_channel_state ADD COLUMN next_check_at TEXT")
+                cursor.execute("ALTER TABLE favorite_channel_state ADD COLUMN upload_history TEXT DEFAULT '[]'")
+
+            _create_tag_stats(cursor)
+
             conn.commit()
             logging.info("Database initialized successfully.")
         except sqlite3.Error as e:
@@ -87,6 +181,184 @@ def init_db():
         logging.error("Could not get DB connection for initialization.")
 
 
+def _tag_stats_changes(row, delta):
+    """SQL statements (for a trigger body) adding `delta` to every facet `row` (NEW/OLD) falls in.
+
+    A negative delta then drops those same facets if they reached zero: primary-key
+    lookups, never a scan of the whole table.
+    """
+    tags = _SAFE_TAGS_SQL.format(tags=f'{row}.tags')
+    rating = f"COALESCE(CAST({row}.rating AS TEXT), 'none')"
+    upsert = f"ON CONFLICT (facet, value) DO UPDATE SET channel_count = channel_count + ({delta})"
+    cleanup = f'''
+        DELETE FROM tag_stats
+        WHERE facet = 'tag' AND value IN (SELECT value FROM json_each({tags})) AND channel_count <= 0;
+        DELETE FROM tag_stats WHERE facet = 'untagged' AND value = '' AND channel_count <= 0;
+        DELETE FROM tag_stats WHERE facet = 'rating' AND value = {rating} AND channel_count <= 0;
+    ''' if delta < 0 else ''
+    return f'''
+        INSERT INTO tag_stats (facet, value, channel_count)
+        SELECT DISTINCT 'tag', tag.value, {delta} FROM json_each({tags}) AS tag WHERE true
+        {upsert};
+        INSERT INTO tag_stats (facet, value, channel_count)
+        SELECT 'untagged', '', {delta} WHERE json_array_length({tags}) = 0
+        {upsert};
+        INSERT INTO tag_stats (facet, value, channel_count)
+        SELECT 'rating', {rating}, {delta} WHERE true
+        {upsert};
+    ''' + cleanup
+
+
+def _create_tag_stats(cursor):
+    """Creates `tag_stats` and the channel triggers that keep it current on every write.
+
+    Each row counts the channels in one facet: a tag, untagged channels, or a rating
+    bucket ('1'..'5', 'none'). Triggers cover every writer (sync, tag edits, bulk
+    operations, deletes, imports), so reads never have to decode channel tags.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='tag_stats'")
+    needs_backfill = cursor.fetchone() is None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tag_stats (
+            facet TEXT NOT NULL,
+            value TEXT NOT NULL,
+            channel_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (facet, value)
+        ) WITHOUT ROWID
+    ''')
+    triggers = {
+        'insert': ('AFTER INSERT ON channels', _tag_stats_changes('NEW', 1)),
+        'delete': ('AFTER DELETE ON channels', _tag_stats_changes('OLD', -1)),
+        'update': (
+            'AFTER UPDATE OF tags, rating ON channels WHEN OLD.tags IS NOT NEW.tags OR OLD.rating IS NOT NEW.rating',
+            _tag_stats_changes('OLD', -1) + _tag_stats_changes('NEW', 1)
+        ),
+    }
+    for name, (timing, body) in triggers.items():
+        # Recreated on every start so databases pick up changes to the trigger bodies.
+        cursor.execute(f'DROP TRIGGER IF EXISTS tag_stats_channels_{name}')
+        cursor.execute(f'''
+            CREATE TRIGGER tag_stats_channels_{name}
+            {timing}
+            BEGIN
+                {body}
+            END
+        ''')
+    if needs_backfill:
+        logging.info("Building tag_stats from existing channels.")
+        _rebuild_tag_stats(cursor)
+
+
+def _rebuild_tag_stats(cursor):
+    tags = _SAFE_TAGS_SQL.format(tags='channels.tags')
+    cursor.execute('DELETE FROM tag_stats')
+    cursor.execute(f'''
+        INSERT INTO tag_stats (facet, value, channel_count)
+        SELECT 'tag', tag.value, COUNT(DISTINCT channels.channel_id)
+        FROM channels, json_each({tags}) AS tag
+        GROUP BY tag.value
+    ''')
+    cursor.execute(f'''
+        INSERT INTO tag_stats (facet, value, channel_count)
+        SELECT 'untagged', '', COUNT(1) FROM channels
+        WHERE json_array_length({tags}) = 0
+        HAVING COUNT(1) > 0
+    ''')
+    cursor.execute('''
+        INSERT INTO tag_stats (facet, value, channel_count)
+        SELECT 'rating', COALESCE(CAST(rating AS TEXT), 'none'), COUNT(1)
+        FROM channels
+        GROUP BY COALESCE(CAST(rating AS TEXT), 'none')
+    ''')
+    # Memoized readers (get_tag_facets) must see the rebuilt counts.
+    cursor.execute(_BUMP_DATA_VERSION_SQL)
+
+
+def _commit(conn, data_changed=True):
+    """Commits, bumping `data_version` once for the whole transaction if it changed VERSIONED_TABLES rows."""
+    if data_changed:
+        conn.execute(_BUMP_DATA_VERSION_SQL)
+    conn.commit()
+
+
+def rebuild_tag_stats():
+    """Recomputes `tag_stats` from scratch (normally never needed; the triggers keep it in sync)."""
+    conn = get_db_connection()
+    success = False
+    if conn:
+        try:
+            with conn:
+                _rebuild_tag_stats(conn.cursor())
+            success = True
+        except sqlite3.Error as e:
+            logging.error(f"Error rebuilding tag stats: {e}")
+        finally:
+            conn.close()
+    return success
+
+
+_version_cache = {}
+_version_cache_lock = threading.Lock()
+
+
+def _cached_by_data_version(func):
+    """Memoizes a no-argument reader until `data_version` changes (in this or any other worker)."""
+    def wrapper():
+        version = get_data_version()
+        with _version_cache_lock:
+            cached = _version_cache.get(func.__name__)
+        if cached and cached[0] == version:
+            return cached[1].copy()
+        value = func()
+        with _version_cache_lock:
+            _version_cache[func.__name__] = (version, value)
+        return value.copy()
+
+    wrapper.__name__ = func.__name__
+    wrapper.__doc__ = func.__doc__
+    return wrapper
+
+
+def acquire_job_lease(job_name, owner, ttl_seconds):
+    """Takes or renews the lease for `job_name`. Returns True if `owner` holds it afterwards."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        now = time.time()
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO job_leases (job_name, owner, expires_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(job_name) DO UPDATE SET
+                owner = excluded.owner,
+                expires_at = excluded.expires_at
+            WHERE job_leases.owner = excluded.owner OR job_leases.expires_at < ?
+        ''', (job_name, owner, now + ttl_seconds, now))
+        conn.commit()
+        return cursor.rowcount > 0
+    except sqlite3.Error as e:
+        logging.error(f"Error acquiring lease for job {job_name}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def release_job_lease(job_name, owner):
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        conn.execute('DELETE FROM job_leases WHERE job_name = ? AND owner = ?', (job_name, owner))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Error releasing lease for job {job_name}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
 def add_or_update_channel(channel_id, title, thumbnail_url):
     """Adds a new channel or updates the title/thumbnail if it already exists. Preserves existing tags and rating."""
     conn = get_db_connection()
@@ -97,25 +369,104 @@ def add_or_update_channel(channel_id, title, thumbnail_url):
                 INSERT OR IGNORE INTO channels (channel_id, title, thumbnail_url, tags, rating)
                 VALUES (?, ?, ?, '[]', NULL)
             ''', (channel_id, title, thumbnail_url))
+            changed = cursor.rowcount
             cursor.execute('''
                 UPDATE channels
                 SET title = ?, thumbnail_url = ?
-                WHERE channel_id = ?
-            ''', (title, thumbnail_url, channel_id))
-            conn.commit()
+                WHERE channel_id = ? AND (title IS NOT ? OR thumbnail_url IS NOT ?)
+            ''', (title, thumbnail_url, channel_id, title, thumbnail_url))
+            _commit(conn, changed > 0 or cursor.rowcount > 0)
         except sqlite3.Error as e:
             logging.error(f"Error adding/updating channel {channel_id}: {e}")
         finally:
             conn.close()
 
 
+def begin_subscription_sync():
+    """Resets the set of channel IDs seen by the subscription sync in progress."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        conn.execute('DELETE FROM subscription_sync_seen')
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Error starting subscription sync: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def upsert_subscription_page(channels):
+    """Adds/updates one page of subscriptions in a single transaction and records them as seen.
+
+    Preserves existing tags and rating. Returns the list of channel IDs that were new, or None on error.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        channel_ids = [channel['channel_id'] for channel in channels]
+        placeholders = ','.join('?' for _ in channel_ids)
+        cursor.execute(f'SELECT channel_id FROM channels WHERE channel_id IN ({placeholders})', channel_ids)
+        existing_ids = {row['channel_id'] for row in cursor.fetchall()}
+
+        cursor.executemany('''
+            INSERT INTO channels (channel_id, title, thumbnail_url, tags, rating)
+            VALUES (?, ?, ?, '[]', NULL)
+            ON CONFLICT(channel_id) DO UPDATE SET
+                title = excluded.title,
+                thumbnail_url = excluded.thumbnail_url
+            WHERE title IS NOT excluded.title OR thumbnail_url IS NOT excluded.thumbnail_url
+        ''', [(channel['channel_id'], channel['title'], channel['thumbnail_url']) for channel in channels])
+        changed = cursor.rowcount
+        cursor.executemany(
+            'INSERT OR IGNORE INTO subscription_sync_seen (channel_id) VALUES (?)',
+            [(channel_id,) for channel_id in channel_ids]
+        )
+        _commit(conn, changed > 0)
+        return [channel_id for channel_id in channel_ids if channel_id not in existing_ids]
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error upserting subscription page: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def finish_subscription_sync():
+    """Deletes channels not seen by the sync that just completed. Returns the deleted IDs, or None on error."""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT channel_id FROM channels
+            WHERE channel_id NOT IN (SELECT channel_id FROM subscription_sync_seen)
+        ''')
+        deleted_ids = [row['channel_id'] for row in cursor.fetchall()]
+        cursor.execute('DELETE FROM channels WHERE channel_id NOT IN (SELECT channel_id FROM subscription_sync_seen)')
+        cursor.execute('DELETE FROM subscription_sync_seen')
+        _commit(conn, bool(deleted_ids))
+        return deleted_ids
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error finishing subscription sync: {e}")
+        return None
+    finally:
+        conn.close()
+
+
 def update_channel_tags(channel_id, tags_list):
     """Updates the tags for a specific channel."""
     conn = get_db_connection()
     success = False
     if conn:
         try:
-            unique_sorted_tags = sorted(list(set(tag.strip() for tag in tags_list if tag.strip())))
+            unique_sorted_tags = _normalize_tags(tags_list)
             tags_json = json.dumps(unique_sorted_tags)
             cursor = conn.cursor()
             cursor.execute('''
@@ -123,7 +474,7 @@ def update_channel_tags(channel_id, tags_list):
                 SET tags = ?
                 WHERE channel_id = ?
             ''', (tags_json, channel_id))
-            conn.commit()
+            _commit(conn, cursor.rowcount > 0)
             logging.info(f"Updated tags for channel {channel_id}: {tags_json}")
             success = True
         except sqlite3.Error as e:
@@ -135,40 +486,272 @@ def update_channel_tags(channel_id, tags_list):
     return success
 
 
+def _normalize_tags(tags_list):
+    return sorted(set(tag.strip() for tag in tags_list if tag and tag.strip()))
+
+
+def bulk_update_channel_tags(channel_ids, add_tags=(), remove_tags=()):
+    """Adds and/or removes tags on many channels in a single transaction.
+
+    Returns a dict channel_id -> resulting tag list for the channels that exist, or None on error.
+    """
+    add_set = set(_normalize_tags(add_tags))
+    remove_set = set(_normalize_tags(remove_tags))
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        channel_ids = list(dict.fromkeys(channel_ids))
+        result = {}
+        updates = []
+        for start in range(0, len(channel_ids), 500):
+            chunk = channel_ids[start:start + 500]
+            placeholders = ','.join('?' for _ in chunk)
+            cursor.execute(f'SELECT channel_id, tags FROM channels WHERE channel_id IN ({placeholders})', chunk)
+            for row in cursor.fetchall():
+                try:
+                    current_tags = json.loads(row['tags'] or '[]')
+                except json.JSONDecodeError:
+                    current_tags = []
+                new_tags = sorted((set(current_tags) | add_set) - remove_set)
+                result[row['channel_id']] = new_tags
+                if new_tags != current_tags:
+                    updates.append((json.dumps(new_tags), row['channel_id']))
+
+        cursor.executemany('UPDATE channels SET tags = ? WHERE channel_id = ?', updates)
+        _commit(conn, bool(updates))
+        logging.info(f"Bulk tag update: {len(updates)} of {len(channel_ids)} channels changed.")
+        return result
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error in bulk tag update: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def bulk_update_channel_rating(channel_ids, rating):
+    """Sets the same rating (1-5 or None) on many channels in a single transaction.
+
+    Returns the number of channels found, or None on error.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        validated_rating = int(rating) if rating is not None and 1 <= int(rating) <= 5 else None
+        cursor = conn.cursor()
+        channel_ids = list(dict.fromkeys(channel_ids))
+        found = 0
+        changed = 0
+        for start in range(0, len(channel_ids), 500):
+            chunk = channel_ids[start:start + 500]
+            placeholders = ','.join('?' for _ in chunk)
+            cursor.execute(f'SELECT COUNT(1) AS total FROM channels WHERE channel_id IN ({placeholders})', chunk)
+            found += cursor.fetchone()['total']
+            cursor.execute(f'''
+                UPDATE channels
+                SET rating = ?
+                WHERE channel_id IN ({placeholders}) AND rating IS NOT ?
+            ''', [validated_rating, *chunk, validated_rating])
+            changed += cursor.rowcount
+        _commit(conn, changed > 0)
+        logging.info(f"Bulk rating update: set {validated_rating} on {found} channels.")
+        return found
+    except (sqlite3.Error, ValueError) as e:
+        conn.rollback()
+        logging.error(f"Error in bulk rating update: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def merge_tags(source_tags, target_tag):
+    """Replaces every source tag with `target_tag` on all channels in one set-based transaction.
+
+    Covers both rename (target unused) and merge (target already in use; duplicates collapse).
+    The target keeps its own color if it has one, otherwise it inherits the first source's color.
+    Returns the number of channels changed, or None on error.
+    """
+    target_tag = (target_tag or '').strip()
+    sources = [tag for tag in _normalize_tags(source_tags) if tag != target_tag]
+    if not target_tag:
+        return None
+    if not sources:
+        return 0
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        sources_json = json.dumps(sources)
+        # A single row with malformed tags must not abort the whole set-based update.
+        tags = _SAFE_TAGS_SQL.format(tags='channels.tags')
+        cursor.execute(f'''
+            UPDATE channels
+            SET tags = (
+                SELECT json_group_array(tag) FROM (
+                    SELECT DISTINCT CASE
+                        WHEN tag_item.value IN (SELECT value FROM json_each(:sources)) THEN :target
+                        ELSE tag_item.value
+                    END AS tag
+                    FROM json_each({tags}) AS tag_item
+                    ORDER BY tag
+                )
+            )
+            WHERE EXISTS (
+                SELECT 1 FROM json_each({tags}) AS tag_item
+                WHERE tag_item.value IN (SELECT value FROM json_each(:sources))
+            )
+        ''', {'sources': sources_json, 'target': target_tag})
+        changed = cursor.rowcount
+        cursor.executemany('''
+            INSERT OR IGNORE INTO tag_colors (tag, color)
+            SELECT ?, color FROM tag_colors WHERE tag = ?
+        ''', [(target_tag, source) for source in sources])
+        cursor.execute(
+            'DELETE FROM tag_colors WHERE tag IN (SELECT value FROM json_each(?))',
+            (sources_json,)
+        )
+        _commit(conn)
+        logging.info(f"Merged tags {sources} into '{target_tag}' on {changed} channels.")
+        return changed
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error merging tags {sources} into '{target_tag}': {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def rename_tag(old_tag, new_tag):
+    """Renames a tag on every channel (merging into `new_tag` if it already exists)."""
+    return merge_tags([old_tag], new_tag)
+
+
+def delete_tag(tag):
+    """Removes a tag from every channel and drops its color, in one transaction.
+
+    Returns the number of channels changed, or None on error.
+    """
+    tag = (tag or '').strip()
+    if not tag:
+        return None
+    conn = get_db_connection()
+    if not conn:
+        return None
+    try:
+        cursor = conn.cursor()
+        tags = _SAFE_TAGS_SQL.format(tags='channels.tags')
+        cursor.execute(f'''
+            UPDATE channels
+            SET tags = (
+                SELECT json_group_array(value) FROM (
+                    SELECT tag_item.value AS value
+                    FROM json_each({tags}) AS tag_item
+                    WHERE tag_item.value != :tag
+                    ORDER BY tag_item.value
+                )
+            )
+            WHERE EXISTS (SELECT 1 FROM json_each({tags}) AS tag_item WHERE tag_item.value = :tag)
+        ''', {'tag': tag})
+        changed = cursor.rowcount
+        cursor.execute('DELETE FROM tag_colors WHERE tag = ?', (tag,))
+        _commit(conn, changed > 0 or cursor.rowcount > 0)
+        logging.info(f"Deleted tag '{tag}' from {changed} channels.")
+        return changed
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error deleting tag '{tag}': {e}")
+        return None
+    finally:
+        conn.close()
+
+
+class ChannelRow(namedtuple('ChannelRow', 'channel_id title thumbnail_url tags rating')):
+    """Compact, read-only channel record yielded by `iter_channels` (tags already decoded)."""
+    __slots__ = ()
+
+    def to_dict(self):
+        return self._asdict()
+
+
+def _decode_tags(tags_json):
+    try:
+        return json.loads(tags_json or '[]')
+    except json.JSONDecodeError:
+        return []
+
+
+def iter_channels():
+    """Yields every channel as a `ChannelRow`, ordered by rating (desc, NULLs last) then title.
+
+    Rows are read lazily from the cursor, so memory stays flat regardless of library size.
+    The connection stays open until the generator is exhausted or closed.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cursor = conn.execute('''
+            SELECT channel_id, title, thumbnail_url, tags, rating
+            FROM channels
+            ORDER BY rating DESC NULLS LAST, title COLLATE NOCASE ASC
+        ''')
+        for channel_id, title, thumbnail_url, tags_json, rating in cursor:
+            yield ChannelRow(channel_id, title, thumbnail_url, _decode_tags(tags_json), rating)
+    except sqlite3.Error as e:
+        logging.error(f"Error iterating channels: {e}")
+    finally:
+        conn.close()
+
+
 def get_all_channels():
     """Retrieves all channels from the database, ordered by rating (desc, NULLs last) then title."""
+    return [channel.to_dict() for channel in iter_channels()]
+
+
+def get_channel(channel_id):
+    """Returns one channel as a dict (tags decoded), or None if it doesn't exist."""
     conn = get_db_connection()
-    channels = []
+    channel = None
     if conn:
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='channels';")
-            if cursor.fetchone():
-                cursor.execute('''
-                    SELECT channel_id, title, thumbnail_url, tags, rating
-                    FROM channels
-                    ORDER BY rating DESC NULLS LAST, title COLLATE NOCASE ASC
-                ''')
-                rows = cursor.fetchall()
-                for row in rows:
-                    channel_dict = dict(row)
-                    try:
-                        channel_dict['tags'] = json.loads(channel_dict.get('tags', '[]') or '[]')
-                    except json.JSONDecodeError:
-                        channel_dict['tags'] = []
-                    channel_dict['rating'] = channel_dict.get('rating') if channel_dict.get('rating') is not None else None
-                    channels.append(channel_dict)
-            else:
-                logging.warning("Table 'channels' does not exist yet.")
+            cursor.execute('''
+                SELECT channel_id, title, thumbnail_url, tags, rating
+                FROM channels
+                WHERE channel_id = ?
+            ''', (channel_id,))
+            row = cursor.fetchone()
+            if row:
+                channel = dict(row)
+                channel['tags'] = _decode_tags(channel['tags'])
+        except sqlite3.Error as e:
+            logging.error(f"Error fetching channel {channel_id}: {e}")
+        finally:
+            conn.close()
+    return channel
+
 
+def get_channel_count():
+    """Returns the number of stored channels without loading any rows."""
+    conn = get_db_connection()
+    count = 0
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(1) AS total FROM channels')
+            count = cursor.fetchone()['total']
         except sqlite3.Error as e:
-            logging.error(f"Error fetching all channels: {e}")
+            logging.error(f"Error counting channels: {e}")
         finally:
             conn.close()
-    return channels
+    return count
 
 
-def get_favorite_channels(min_rating=4):
+def get_favorite_channels(min_rating=FAVORITE_MIN_RATING):
     """Retrieves channels with rating >= min_rating."""
     conn = get_db_connection()
     favorites = []
@@ -191,11 +774,38 @@ def get_favorite_channels(min_rating=4):
 
 def get_unique_tags():
     """Retrieves a list of all unique tags used across all channels."""
-    all_channels = get_all_channels()
-    unique_tags = set()
-    for channel in all_channels:
-        unique_tags.update(channel.get('tags', []))
-    return sorted(list(unique_tags))
+    return list(get_tag_facets()['tags'])
+
+
+@_cached_by_data_version
+def get_tag_facets():
+    """Channel counts per tag, for untagged channels and per rating bucket, read from `tag_stats`.
+
+    Returns {'tags': {tag: count} (sorted by tag), 'untagged': int,
+    'ratings': {'1'..'5' or 'none': count}}.
+    """
+    conn = get_db_connection()
+    facets = {'tags': {}, 'untagged': 0, 'ratings': {}}
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT facet, value, channel_count
+                FROM tag_stats
+                ORDER BY facet, value
+            ''')
+            for facet, value, channel_count in cursor:
+                if facet == 'tag':
+                    facets['tags'][value] = channel_count
+                elif facet == 'untagged':
+                    facets['untagged'] = channel_count
+                elif facet == 'rating':
+                    facets['ratings'][value] = channel_count
+        except sqlite3.Error as e:
+            logging.error(f"Error fetching tag facets: {e}")
+        finally:
+            conn.close()
+    return facets
 
 
 def set_tag_color(tag, color):
@@ -209,7 +819,7 @@ def set_tag_color(tag, color):
                 INSERT OR REPLACE INTO tag_colors (tag, color)
                 VALUES (?, ?)
             ''', (tag, color))
-            conn.commit()
+            _commit(conn)
             logging.info(f"Set color for tag '{tag}' to {color}")
             success = True
         except sqlite3.Error as e:
@@ -219,6 +829,7 @@ def set_tag_color(tag, color):
     return success
 
 
+@_cached_by_data_version
 def get_tag_colors():
     """Recupera un diccionario con los colores asignados a cada tag."""
     conn = get_db_connection()
@@ -263,6 +874,27 @@ def get_all_channel_ids():
     return channel_ids
 
 
+def is_known_thumbnail_url(url):
+    """True if the URL is stored as a channel or cached favorite-video thumbnail."""
+    conn = get_db_connection()
+    known = False
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT 1 FROM channels WHERE thumbnail_url = ?
+                UNION ALL
+                SELECT 1 FROM favorite_video_cache WHERE thumbnail_url = ?
+                LIMIT 1
+            ''', (url, url))
+            known = cursor.fetchone() is not None
+        except sqlite3.Error as e:
+            logging.error(f"Error checking thumbnail URL: {e}")
+        finally:
+            conn.close()
+    return known
+
+
 def delete_channel(channel_id):
     """Elimina un canal específico de la base de datos."""
     conn = get_db_connection()
@@ -271,7 +903,7 @@ def delete_channel(channel_id):
         try:
             cursor = conn.cursor()
             cursor.execute('DELETE FROM channels WHERE channel_id = ?', (channel_id,))
-            conn.commit()
+            _commit(conn, cursor.rowcount > 0)
             if cursor.rowcount > 0:
                 logging.info(f"Deleted channel with ID: {channel_id}")
                 success = True
@@ -299,7 +931,7 @@ def update_channel_rating(channel_id, rating):
                 SET rating = ?
                 WHERE channel_id = ?
             ''', (validated_rating, channel_id))
-            conn.commit()
+            _commit(conn, cursor.rowcount > 0)
             if cursor.rowcount > 0:
                 logging.info(f"Updated rating for channel {channel_id} to {validated_rating}")
                 success = True
@@ -349,6 +981,11 @@ def get_app_state(key, default_value=None):
         conn.close()
 
 
+def get_data_version():
+    """Monotonic counter bumped by every transaction that writes to VERSIONED_TABLES."""
+    return get_app_state('data_version', '0')
+
+
 def get_last_favorites_check():
     return get_app_state('favorites_last_check_at')
 
@@ -357,21 +994,73 @@ def set_last_favorites_check(timestamp_iso):
     return set_app_state('favorites_last_check_at', timestamp_iso)
 
 
-def replace_favorite_video_cache(videos):
+def get_favorite_channel_states():
+    """Returns a dict channel_id -> {last_checked_at, is_stale, last_error, next_check_at, upload_history}
+    for tracked favorite channels (`upload_history`: recent upload timestamps, newest first)."""
+    conn = get_db_connection()
+    states = {}
+    if conn:
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT channel_id, last_checked_at, is_stale, last_error, next_check_at, upload_history
+                FROM favorite_channel_state
+            ''')
+            for row in cursor.fetchall():
+                state = dict(row)
+                state['is_stale'] = bool(state['is_stale'])
+                state['upload_history'] = _decode_tags(state['upload_history'])
+                states[row['channel_id']] = state
+        except sqlite3.Error as e:
+            logging.error(f"Error reading favorite channel states: {e}")
+        finally:
+            conn.close()
+    return states
+
+
+def get_stale_favorite_channel_ids():
+    """Sorted IDs of favorite channels whose last refresh failed."""
+    return sorted(channel_id for channel_id, state in get_favorite_channel_states().items() if state['is_stale'])
+
+
+def replace_favorite_videos_for_channel(channel_id, videos, checked_at, next_check_at=None, upload_history=None):
+    """Replaces the cached videos of one channel and marks it as freshly checked, in one transaction.
+
+    `next_check_at` and `upload_history` (recent upload timestamps) feed adaptive polling;
+    a None `upload_history` keeps the stored one.
+    """
     conn = get_db_connection()
     if not conn:
         return False
     try:
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM favorite_video_cache')
+        # Upsert only changed rows and delete dropped ones, so an unchanged channel doesn't bump data_version.
+        video_ids = [video.get('video_id') for video in videos]
+        placeholders = ','.join('?' for _ in video_ids)
+        cursor.execute(
+            f'DELETE FROM favorite_video_cache WHERE channel_id = ? AND video_id NOT IN ({placeholders})',
+            [channel_id, *video_ids]
+        )
+        changed = cursor.rowcount
         cursor.executemany('''
             INSERT INTO favorite_video_cache (
                 video_id, channel_id, channel_title, title, published_at, thumbnail_url, video_url, duration_text
             ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(video_id) DO UPDATE SET
+                channel_id = excluded.channel_id,
+                channel_title = excluded.channel_title,
+                title = excluded.title,
+                published_at = excluded.published_at,
+                thumbnail_url = excluded.thumbnail_url,
+                video_url = excluded.video_url,
+                duration_text = excluded.duration_text
+            WHERE (channel_id, channel_title, title, published_at, thumbnail_url, video_url, duration_text)
+                IS NOT (excluded.channel_id, excluded.channel_title, excluded.title, excluded.published_at,
+                        excluded.thumbnail_url, excluded.video_url, excluded.duration_text)
         ''', [
             (
                 video.get('video_id'),
-                video.get('channel_id'),
+                channel_id,
                 video.get('channel_title'),
                 video.get('title'),
                 video.get('published_at'),
@@ -381,29 +1070,329 @@ def replace_favorite_video_cache(videos):
             )
             for video in videos
         ])
+        changed += cursor.rowcount
+        cursor.execute('''
+            INSERT INTO favorite_channel_state (channel_id, last_checked_at, is_stale, last_error, next_check_at, upload_history)
+            VALUES (?, ?, 0, NULL, ?, COALESCE(?, '[]'))
+            ON CONFLICT(channel_id) DO UPDATE SET
+                last_checked_at = excluded.last_checked_at,
+                is_stale = 0,
+                last_error = NULL,
+                next_check_at = excluded.next_check_at,
+                upload_history = COALESCE(?, upload_history)
+        ''', (
+            channel_id,
+            checked_at,
+            next_check_at,
+            None if upload_history is None else json.dumps(upload_history),
+            None if upload_history is None else json.dumps(upload_history)
+        ))
+        _commit(conn, changed > 0)
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error replacing favorite video cache for channel {channel_id}: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def mark_favorite_channel_stale(channel_id, error_message=None, last_checked_at=None):
+    """Flags a channel whose refresh failed; its cached videos and last check are kept.
+
+    `last_checked_at` only seeds channels that have no state yet, so their window isn't lost.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO favorite_channel_state (channel_id, last_checked_at, is_stale, last_error)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT(channel_id) DO UPDATE SET
+                is_stale = 1,
+                last_error = excluded.last_error
+        ''', (channel_id, last_checked_at, error_message))
         conn.commit()
         return True
     except sqlite3.Error as e:
-        logging.error(f"Error replacing favorite video cache: {e}")
+        logging.error(f"Error marking favorite channel {channel_id} as stale: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def prune_favorite_video_cache(favorite_channel_ids):
+    """Drops cached videos and state for channels that are no longer favorites."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS keep_channel_ids (channel_id TEXT PRIMARY KEY)')
+        cursor.execute('DELETE FROM keep_channel_ids')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO keep_channel_ids (channel_id) VALUES (?)',
+            [(channel_id,) for channel_id in favorite_channel_ids]
+        )
+        cursor.execute('DELETE FROM favorite_video_cache WHERE channel_id NOT IN (SELECT channel_id FROM keep_channel_ids)')
+        changed = cursor.rowcount
+        cursor.execute('DELETE FROM favorite_channel_state WHERE channel_id NOT IN (SELECT channel_id FROM keep_channel_ids)')
+        _commit(conn, changed > 0)
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error pruning favorite video cache: {e}")
         return False
     finally:
         conn.close()
 
 
-def get_favorite_video_cache():
+def get_video_details(video_ids):
+    """Returns a dict video_id -> cached details for the given IDs that are already known."""
+    conn = get_db_connection()
+    details = {}
+    if not conn:
+        return details
+    try:
+        cursor = conn.cursor()
+        video_ids = list(video_ids)
+        for start in range(0, len(video_ids), 500):
+            chunk = video_ids[start:start + 500]
+            placeholders = ','.join('?' for _ in chunk)
+            cursor.execute(f'''
+                SELECT video_id, duration_iso, duration_text, live_broadcast_content, fetched_at
+                FROM video_details
+                WHERE video_id IN ({placeholders})
+            ''', chunk)
+            for row in cursor.fetchall():
+                details[row['video_id']] = dict(row)
+    except sqlite3.Error as e:
+        logging.error(f"Error reading video details: {e}")
+    finally:
+        conn.close()
+    return details
+
+
+def upsert_video_details(details_list):
+    """Stores immutable per-video details (duration, live status) fetched from the API."""
+    if not details_list:
+        return True
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT INTO video_details (video_id, duration_iso, duration_text, live_broadcast_content, fetched_at)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(video_id) DO UPDATE SET
+                duration_iso = excluded.duration_iso,
+                duration_text = excluded.duration_text,
+                live_broadcast_content = excluded.live_broadcast_content,
+                fetched_at = excluded.fetched_at
+        ''', [
+            (
+                details.get('video_id'),
+                details.get('duration_iso'),
+                details.get('duration_text'),
+                details.get('live_broadcast_content'),
+                details.get('fetched_at')
+            )
+            for details in details_list
+        ])
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logging.error(f"Error storing video details: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def enforce_favorite_video_retention(channel_ids=(), now=None):
+    """Applies the favorite_video_cache limits using indexed deletes, then drops video_details rows
+    for videos no longer cached. Returns the number of rows removed.
+
+    The per-channel limit is only checked for `channel_ids` (the channels just refreshed),
+    so the cost per refresh is proportional to what changed, not to the cache size.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return 0
+    removed = 0
+    try:
+        cursor = conn.cursor()
+        if FAVORITE_CACHE_MAX_AGE_DAYS > 0:
+            now = now or datetime.now(timezone.utc)
+            cutoff = (now - timedelta(days=FAVORITE_CACHE_MAX_AGE_DAYS)).strftime('%Y-%m-%dT%H:%M:%SZ')
+            cursor.execute('DELETE FROM favorite_video_cache WHERE published_at < ?', (cutoff,))
+            removed += cursor.rowcount
+        if FAVORITE_CACHE_MAX_PER_CHANNEL > 0:
+            for channel_id in channel_ids:
+                cursor.execute('''
+                    DELETE FROM favorite_video_cache
+                    WHERE video_id IN (
+                        SELECT video_id FROM favorite_video_cache
+                        WHERE channel_id = ?
+                        ORDER BY published_at DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                ''', (channel_id, FAVORITE_CACHE_MAX_PER_CHANNEL))
+                removed += cursor.rowcount
+        if FAVORITE_CACHE_MAX_ROWS > 0:
+            cursor.execute('''
+                DELETE FROM favorite_video_cache
+                WHERE video_id IN (
+                    SELECT video_id FROM favorite_video_cache
+                    ORDER BY published_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            ''', (FAVORITE_CACHE_MAX_ROWS,))
+            removed += cursor.rowcount
+        cached_rows_removed = removed
+        # video_details only serves cached favorite videos; drop what they no longer reference.
+        cursor.execute('''
+            DELETE FROM video_details
+            WHERE video_id NOT IN (SELECT video_id FROM favorite_video_cache)
+        ''')
+        removed += cursor.rowcount
+        _commit(conn, cached_rows_removed > 0)
+        if removed:
+            logging.info(f"Favorite video cache retention removed {removed} rows.")
+    except sqlite3.Error as e:
+        conn.rollback()
+        logging.error(f"Error enforcing favorite video cache retention: {e}")
+    finally:
+        conn.close()
+    return removed
+
+
+def compact_database_if_needed(max_pages=VACUUM_INCREMENTAL_MAX_PAGES):
+    """Returns up to `max_pages` free pages to the filesystem once enough have accumulated.
+
+    Only ever runs an incremental vacuum, so it is cheap enough for the request path. A file
+    created before auto_vacuum was enabled is left alone until vacuum_database() converts it.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        conn.isolation_level = None
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if free_pages < VACUUM_MIN_FREE_PAGES:
+            return False
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            logging.info(f"{free_pages} free pages, but incremental vacuum is off; run 'python cli.py vacuum'.")
+            return False
+        # execute() steps the pragma once, which frees a single page; executescript() runs it to completion.
+        conn.executescript(f'PRAGMA incremental_vacuum({int(max_pages)});')
+        logging.info(f"Compacted database, reclaimed about {min(free_pages, max_pages)} pages.")
+        return True
+    except sqlite3.Error as e:
+        logging.warning(f"Could not compact database: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def uses_incremental_vacuum():
+    """True if the database file is in incremental auto_vacuum mode."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        return conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    except sqlite3.Error as e:
+        logging.warning(f"Could not read auto_vacuum mode: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def vacuum_database():
+    """Rewrites the whole file with a full VACUUM, switching it to incremental auto_vacuum.
+
+    Locks out every writer while it runs: meant for the CLI and the background refresher,
+    never for a request.
+    """
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        conn.isolation_level = None
+        conn.execute('PRAGMA auto_vacuum=INCREMENTAL')
+        conn.execute('VACUUM')
+        logging.info("Database vacuumed.")
+        return True
+    except sqlite3.Error as e:
+        logging.warning(f"Could not vacuum database: {e}")
+        return False
+    finally:
+        conn.close()
+
+
+def favorite_view_window_start(view_mode, now=None):
+    """Lower `published_at` bound of a date-window view (hour granularity, so it is cacheable), else None."""
+    days = FAVORITE_VIEW_WINDOW_DAYS.get(view_mode)
+    if not days:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return (now - timedelta(days=days)).strftime('%Y-%m-%dT%H:00:00Z')
+
+
+def get_favorite_video_cache(view_mode='channel', since=None):
+    """Returns the cached favorite videos for one view mode, filtered and ordered in SQL.
+
+    - 'channel': grouped by channel (title order), newest first, at most
+      FAVORITE_VIEW_MAX_PER_CHANNEL videos per channel.
+    - 'date_desc' / 'date_asc': all channels by publish date.
+    - 'last_7_days' / 'last_30_days': videos published since `since` (defaults to
+      `favorite_view_window_start`), oldest first.
+    Every mode returns at most FAVORITE_VIEW_MAX_ROWS rows.
+    """
+    columns = 'video_id, channel_id, channel_title, title, published_at, thumbnail_url, video_url, duration_text'
+    if view_mode == 'date_desc':
+        query = f'SELECT {columns} FROM favorite_video_cache ORDER BY published_at DESC LIMIT ?'
+        params = (FAVORITE_VIEW_MAX_ROWS,)
+    elif view_mode == 'date_asc':
+        query = f'SELECT {columns} FROM favorite_video_cache ORDER BY published_at ASC LIMIT ?'
+        params = (FAVORITE_VIEW_MAX_ROWS,)
+    elif view_mode in FAVORITE_VIEW_WINDOW_DAYS:
+        # Keep the newest rows of the window if it is capped, then show them oldest first.
+        query = f'''
+            SELECT * FROM (
+                SELECT {columns} FROM favorite_video_cache
+                WHERE published_at >= ?
+                ORDER BY published_at DESC
+                LIMIT ?
+            )
+            ORDER BY published_at ASC
+        '''
+        params = (since or favorite_view_window_start(view_mode), FAVORITE_VIEW_MAX_ROWS)
+    else:
+        query = f'''
+            SELECT {columns} FROM (
+                SELECT {columns},
+                    ROW_NUMBER() OVER (PARTITION BY channel_id ORDER BY published_at DESC) AS channel_rank
+                FROM favorite_video_cache
+            )
+            WHERE channel_rank <= ?
+            ORDER BY channel_title COLLATE NOCASE ASC, channel_id, published_at DESC
+            LIMIT ?
+        '''
+        params = (FAVORITE_VIEW_MAX_PER_CHANNEL, FAVORITE_VIEW_MAX_ROWS)
+
     conn = get_db_connection()
     videos = []
     if conn:
         try:
             cursor = conn.cursor()
-            cursor.execute('''
-                SELECT video_id, channel_id, channel_title, title, published_at, thumbnail_url, video_url, duration_text
-                FROM favorite_video_cache
-                ORDER BY channel_title COLLATE NOCASE ASC, published_at DESC
-            ''')
+            cursor.execute(query, params)
             videos = [dict(row) for row in cursor.fetchall()]
         except sqlite3.Error as e:
-            logging.error(f"Error reading favorite video cache: {e}")
+            logging.error(f"Error reading favorite video cache ({view_mode}): {e}")
         finally:
             conn.close()
     return videos
@@ -425,5 +1414,115 @@ def get_favorite_video_cache_count():
     return count
 
 
+EXPORT_FORMAT = 'youtube-subscription-tagger'
+EXPORT_FORMAT_VERSION = 1
+# Columns exported per record type; import upserts exactly these.
+EXPORT_TABLES = {
+    'channel': ('channels', 'channel_id', ('channel_id', 'title', 'thumbnail_url', 'tags', 'rating')),
+    'tag_color': ('tag_colors', 'tag', ('tag', 'color')),
+    'favorite_video': ('favorite_video_cache', 'video_id', (
+        'video_id', 'channel_id', 'channel_title', 'title', 'published_at', 'thumbnail_url', 'video_url', 'duration_text'
+    )),
+}
+
+
+def iter_export_records():
+    """Yields every exportable row as a dict with a `type` key, reading through a cursor (constant memory).
+
+    Channel `tags` are decoded to lists so the export is plain JSON.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise sqlite3.OperationalError("Could not open database for export.")
+    try:
+        for record_type, (table, key, columns) in EXPORT_TABLES.items():
+            cursor = conn.execute(f"SELECT {', '.join(columns)} FROM {table} ORDER BY {key}")
+            for row in cursor:
+                record = {'type': record_type, **dict(row)}
+                if record_type == 'channel':
+                    try:
+                        record['tags'] = json.loads(record['tags'] or '[]')
+                    except json.JSONDecodeError:
+                        record['tags'] = []
+                yield record
+    finally:
+        conn.close()
+
+
+def _validate_import_record(record):
+    """Raises ValueError unless `record` is a well-formed export record; returns its type."""
+    if not isinstance(record, dict):
+        raise ValueError("record is not a JSON object.")
+    record_type = record.get('type')
+    if record_type not in EXPORT_TABLES:
+        return record_type
+    key = EXPORT_TABLES[record_type][1]
+    if not isinstance(record.get(key), str) or not record[key]:
+        raise ValueError(f"{record_type} record without a string '{key}'.")
+    if record_type == 'channel':
+        if not isinstance(record.get('title'), str):
+            raise ValueError(f"channel {record[key]}: 'title' must be a string.")
+        tags = record.get('tags')
+        if tags is not None and (not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags)):
+            raise ValueError(f"channel {record[key]}: 'tags' must be a list of strings.")
+        rating = record.get('rating')
+        if rating is not None and (isinstance(rating, bool) or not isinstance(rating, int) or not 1 <= rating <= 5):
+            raise ValueError(f"channel {record[key]}: 'rating' must be an integer between 1 and 5, or null.")
+    return record_type
+
+
+def import_records(records, batch_size=1000):
+    """Upserts exported records in batches inside a single transaction (all or nothing).
+
+    `records` may be any iterable (e.g. a generator over an NDJSON file); only one batch
+    per type is held in memory. Returns a dict of counts per record type. Raises
+    ValueError for malformed records, after rolling back.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise sqlite3.OperationalError("Could not open database for import.")
+
+    statements = {}
+    for record_type, (table, key, columns) in EXPORT_TABLES.items():
+        updates = ', '.join(f"{column} = excluded.{column}" for column in columns if column != key)
+        statements[record_type] = f'''
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES ({', '.join('?' for _ in columns)})
+            ON CONFLICT({key}) DO UPDATE SET {updates}
+        '''
+    batches = {record_type: [] for record_type in EXPORT_TABLES}
+    counts = {record_type: 0 for record_type in EXPORT_TABLES}
+
+    def flush(record_type):
+        if batches[record_type]:
+            conn.executemany(statements[record_type], batches[record_type])
+            counts[record_type] += len(batches[record_type])
+            batches[record_type] = []
+
+    try:
+        conn.execute('BEGIN')
+        for record in records:
+            record_type = _validate_import_record(record)
+            if record_type not in EXPORT_TABLES:
+                continue
+            columns = EXPORT_TABLES[record_type][2]
+            values = dict(record)
+            if record_type == 'channel':
+                values['tags'] = json.dumps(_normalize_tags(values.get('tags') or []))
+            batches[record_type].append(tuple(values.get(column) for column in columns))
+            if len(batches[record_type]) >= batch_size:
+                flush(record_type)
+        for record_type in EXPORT_TABLES:
+            flush(record_type)
+        _commit(conn, any(counts.values()))
+        logging.info(f"Import complete: {counts}")
+        return counts
+    except (sqlite3.Error, ValueError):
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
 # Initialize the database when this module is imported
 init_db()
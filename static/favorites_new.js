@@ -2,72 +2,30 @@
     const dataNode = document.getElementById('favorites-videos-data');
     if (!dataNode) return;
 
-    let allVideos = [];
+    const placeholderSrc = dataNode.dataset.placeholder || '';
+    const thumbnailProxyUrl = dataNode.dataset.thumbnailProxy || '';
+    let staleChannelIds = new Set();
     try {
-        allVideos = JSON.parse(dataNode.textContent || '[]');
+        staleChannelIds = new Set(JSON.parse(dataNode.dataset.staleChannels || '[]'));
     } catch (error) {
-        console.error('No se pudo parsear favorites-videos-data', error);
-        allVideos = [];
+        console.error('No se pudo parsear data-stale-channels', error);
     }
-
-    const placeholderSrc = dataNode.dataset.placeholder || '';
     const buttons = Array.from(document.querySelectorAll('.favorites-view-button'));
     const resultsContainer = document.getElementById('favorites-results');
     const totalVideosEl = document.getElementById('total-new-videos');
     const totalChannelsEl = document.getElementById('total-channels');
+    const streamStatusEl = document.getElementById('favorites-stream-status');
+    const warningEl = document.getElementById('favorites-warning');
+    const retryLinkEl = document.getElementById('favorites-retry-link');
+    const staleCountEl = document.getElementById('favorites-stale-count');
+    const viewUrl = dataNode.dataset.viewUrl || '';
+    let currentView = dataNode.dataset.view || 'channel';
+    let reloadTimer = null;
+    let latestRequest = 0;
 
-    function parseDate(video) {
-        return new Date(video.published_at || 0);
-    }
-
-    function isInLastDays(video, days) {
-        const published = parseDate(video);
-        if (Number.isNaN(published.getTime())) {
-            return false;
-        }
-        const threshold = new Date();
-        threshold.setUTCDate(threshold.getUTCDate() - days);
-        return published >= threshold;
-    }
-
-    function buildSections(viewMode) {
-        if (viewMode === 'date_desc') {
-            return [{
-                title: 'Todos los canales (más recientes primero)',
-                videos: [...allVideos].sort((a, b) => parseDate(b) - parseDate(a))
-            }];
-        }
-
-        if (viewMode === 'date_asc') {
-            return [{
-                title: 'Todos los canales (más antiguos primero)',
-                videos: [...allVideos].sort((a, b) => parseDate(a) - parseDate(b))
-            }];
-        }
-
-        if (viewMode === 'last_7_days' || viewMode === 'last_30_days') {
-            const days = viewMode === 'last_7_days' ? 7 : 30;
-            return [{
-                title: `Todos los canales (últimos ${days} días, del más viejo al más nuevo)`,
-                videos: allVideos
-                    .filter(video => isInLastDays(video, days))
-                    .sort((a, b) => parseDate(a) - parseDate(b))
-            }];
-        }
-
-        const groups = new Map();
-        for (const video of allVideos) {
-            const channel = video.channel_title || 'Sin canal';
-            if (!groups.has(channel)) groups.set(channel, []);
-            groups.get(channel).push(video);
-        }
-
-        return Array.from(groups.entries())
-            .sort((a, b) => a[0].localeCompare(b[0], 'es', { sensitivity: 'base' }))
-            .map(([title, videos]) => ({
-                title,
-                videos: videos.sort((a, b) => parseDate(b) - parseDate(a))
-            }));
+    function thumbnailSrc(url) {
+        if (!url) return placeholderSrc;
+        return thumbnailProxyUrl ? `${thumbnailProxyUrl}?url=${encodeURIComponent(url)}` : url;
     }
 
     function escapeHtml(text) {
@@ -79,26 +37,24 @@
             .replaceAll("'", '&#39;');
     }
 
-    function render(viewMode) {
-        const sections = buildSections(viewMode);
-        const totalVideos = sections.reduce((acc, section) => acc + section.videos.length, 0);
-        const channelCount = new Set(sections.flatMap(section => section.videos).map(video => video.channel_id)).size;
+    // El servidor filtra y ordena cada vista en SQL; acá solo se pinta lo que devuelve
+    function render(result) {
+        const sections = result.sections || [];
+        totalVideosEl.textContent = String(result.total_new_videos || 0);
+        totalChannelsEl.textContent = String(result.total_channels || 0);
 
-        totalVideosEl.textContent = String(totalVideos);
-        totalChannelsEl.textContent = String(channelCount);
-
-        if (!totalVideos) {
+        if (!sections.length) {
             resultsContainer.innerHTML = '<p>No hay videos nuevos para mostrar en este momento.</p>';
             return;
         }
 
         resultsContainer.innerHTML = sections.map(section => `
             <section class="favorites-channel-group">
-                <h2>${section.title} <span>(${section.videos.length})</span></h2>
+                <h2>${escapeHtml(section.title)} <span>(${section.videos.length})</span>${section.stale ? ' <span class="stale-badge">cacheado</span>' : ''}</h2>
                 <ul class="favorites-video-list">
                     ${section.videos.map(video => `
                         <li class="favorites-video-item">
-                            <img src="${video.thumbnail_url || placeholderSrc}" alt="Miniatura de ${escapeHtml(video.title)}" class="favorites-thumbnail">
+                            <img src="${escapeHtml(thumbnailSrc(video.thumbnail_url))}" loading="lazy" alt="Miniatura de ${escapeHtml(video.title)}" class="favorites-thumbnail">
                             <div class="favorites-video-meta">
                                 <a href="${escapeHtml(video.video_url)}" target="_blank" rel="noopener noreferrer">${escapeHtml(video.title)}</a>
                                 <p>Publicado: ${escapeHtml(video.published_at || '')}</p>
@@ -111,11 +67,90 @@
         `).join('');
     }
 
+    async function loadView(viewMode) {
+        const requestId = ++latestRequest;
+        try {
+            const response = await fetch(`${viewUrl}?view=${encodeURIComponent(viewMode)}`);
+            const result = await response.json();
+            if (requestId !== latestRequest) return; // llegó una vista más nueva mientras tanto
+            if (!response.ok || !result.success) {
+                throw new Error(result.message || `HTTP ${response.status}`);
+            }
+            updateStaleChannels(result.stale_channel_ids || []);
+            render(result);
+        } catch (error) {
+            console.error('No se pudo cargar la vista de favoritos', error);
+        }
+    }
+
+    // Agrupa varias actualizaciones del stream en una sola consulta al servidor
+    function scheduleReload() {
+        if (reloadTimer) return;
+        reloadTimer = setTimeout(() => {
+            reloadTimer = null;
+            loadView(currentView);
+        }, 500);
+    }
+
+    function updateStaleChannels(channelIds) {
+        staleChannelIds = new Set(channelIds);
+        if (staleCountEl) staleCountEl.textContent = String(staleChannelIds.size);
+        if (retryLinkEl) retryLinkEl.hidden = staleChannelIds.size === 0;
+    }
+
+    // Muestra primero la caché y reemplaza los videos de cada canal a medida que llegan
+    function startStreaming(streamUrl) {
+        const source = new EventSource(streamUrl);
+        let channelsDone = 0;
+
+        source.addEventListener('channel', () => {
+            // Cada canal ya quedó guardado en la caché cuando llega su evento
+            channelsDone += 1;
+            if (streamStatusEl) {
+                streamStatusEl.textContent = `Buscando videos nuevos… ${channelsDone} canales actualizados.`;
+            }
+            scheduleReload();
+        });
+
+        source.addEventListener('done', (message) => {
+            source.close();
+            const event = JSON.parse(message.data);
+            updateStaleChannels(event.stale_channel_ids || []);
+            if (warningEl) {
+                warningEl.textContent = event.warning_message || '';
+                warningEl.hidden = !event.warning_message;
+            }
+            if (streamStatusEl) streamStatusEl.hidden = true;
+            scheduleReload();
+        });
+
+        source.addEventListener('busy', (message) => {
+            source.close();
+            const event = JSON.parse(message.data);
+            if (streamStatusEl) streamStatusEl.textContent = event.message;
+        });
+
+        source.addEventListener('error', () => {
+            source.close();
+            if (streamStatusEl) {
+                streamStatusEl.textContent = 'No se pudo completar la actualización en vivo. Mostrando resultados cacheados.';
+            }
+        });
+    }
+
     buttons.forEach(button => {
         button.addEventListener('click', () => {
             buttons.forEach(btn => btn.classList.remove('active'));
             button.classList.add('active');
-            render(button.dataset.view);
+            currentView = button.dataset.view;
+            const url = new URL(window.location.href);
+            url.searchParams.set('view', currentView);
+            window.history.replaceState(null, '', url);
+            loadView(currentView);
         });
     });
+
+    if (dataNode.dataset.streamUrl) {
+        startStreaming(dataNode.dataset.streamUrl);
+    }
 })();
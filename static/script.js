@@ -163,9 +163,19 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     }
 
+    // Contador de canales para un botón de filtro (viene de tag_stats en el servidor)
+    function createTagCountSpan(count) {
+        const countSpan = document.createElement('span');
+        countSpan.className = 'tag-count';
+        countSpan.textContent = count ?? 0;
+        return countSpan;
+    }
+
     // Actualiza la lista de botones de filtro y la lista interactiva de tags
-    function updateTagFilters(uniqueTags) {
+    function updateTagFilters(uniqueTags, tagFacets) {
         if (!tagFilterList || !allUniqueTagsList) return;
+        if (tagFacets) window.tagFacets = tagFacets;
+        const facets = window.tagFacets || { tags: {}, untagged: 0 };
 
         // --- Update Filter Buttons ---
         const currentActiveButtons = Array.from(tagFilterList.querySelectorAll('.tag-filter.selected'))
@@ -189,7 +199,8 @@ document.addEventListener('DOMContentLoaded', () => {
         const noTagButton = document.createElement('button');
         noTagButton.className = 'tag-filter';
         noTagButton.dataset.tag = 'no-tag';
-        noTagButton.textContent = 'No Tags';
+        noTagButton.textContent = 'No Tags ';
+        noTagButton.appendChild(createTagCountSpan(facets.untagged));
         noTagButton.style.backgroundColor = '#ff6b6b';
         noTagButton.style.borderColor = '#ff6b6b';
         if (currentActiveButtons.includes('no-tag')) {
@@ -203,7 +214,8 @@ document.addEventListener('DOMContentLoaded', () => {
             const color = getTagColor(tag);
             button.className = 'tag-filter';
             button.dataset.tag = tag;
-            button.textContent = tag;
+            button.textContent = `${tag} `;
+            button.appendChild(createTagCountSpan(facets.tags?.[tag]));
             button.style.backgroundColor = color;
             button.style.borderColor = color;
             if (currentActiveButtons.includes(tag)) {
@@ -371,10 +383,14 @@ document.addEventListener('DOMContentLoaded', () => {
                 : '';
 
              // Usar placeholder si no hay thumbnail
-             const thumbnailUrl = channel.thumbnail_url || '/static/placeholder.png';
+             const thumbnailUrl = !channel.thumbnail_url
+                 ? '/static/placeholder.png'
+                 : window.THUMBNAIL_PROXY_URL
+                     ? `${window.THUMBNAIL_PROXY_URL}?url=${encodeURIComponent(channel.thumbnail_url)}`
+                     : channel.thumbnail_url;
 
              card.innerHTML = `
-                <img src="${thumbnailUrl}" alt="${escapeHtml(channel.title)} thumbnail" class="thumbnail">
+                <img src="${thumbnailUrl}" loading="lazy" alt="${escapeHtml(channel.title)} thumbnail" class="thumbnail">
                 <div class="channel-info">
                     <h3>
                         <a href="https://www.youtube.com/channel/${channel.channel_id}" target="_blank" rel="noopener noreferrer" title="Visit channel on YouTube">
@@ -432,7 +448,7 @@ document.addEventListener('DOMContentLoaded', () => {
                         const card = button.closest('.channel-card');
                         if(card) card.dataset.tags = JSON.stringify(result.tags);
                         
-                        updateTagFilters(result.unique_tags);
+                        updateTagFilters(result.unique_tags, result.tag_facets);
                         
                         // Re-apply current filter
                         filterChannelsByTag();
@@ -570,6 +586,33 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     }
 
+    // Reads the NDJSON progress stream of a refresh and returns its final event
+    async function readRefreshStream(response) {
+        if (!response.body || !(response.headers.get('Content-Type') || '').includes('ndjson')) {
+            return response.json();
+        }
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let lastEvent = { success: false, message: 'Refresh stream ended unexpectedly.' };
+        while (true) {
+            const { value, done } = await reader.read();
+            buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+            const lines = buffer.split('\n');
+            buffer = done ? '' : lines.pop();
+            for (const line of lines) {
+                if (!line.trim()) continue;
+                const event = JSON.parse(line);
+                if (event.event === 'page') {
+                    refreshStatus.textContent = `Refreshing... ${event.pages} pages, ${event.fetched} channels fetched, ${event.added} new.`;
+                } else {
+                    lastEvent = event;
+                }
+            }
+            if (done) return lastEvent;
+        }
+    }
+
     // Event listener for refresh button
     if (refreshButton) {
         refreshButton.addEventListener('click', async () => {
@@ -578,8 +621,8 @@ document.addEventListener('DOMContentLoaded', () => {
             refreshButton.disabled = true;
 
             try {
-                const response = await fetch('/refresh_from_youtube', { method: 'POST' });
-                const result = await response.json();
+                const response = await fetch('/refresh_from_youtube/stream', { method: 'POST' });
+                const result = await readRefreshStream(response);
 
                 if (response.ok && result.success) {
                     refreshStatus.textContent = result.message || 'Refresh successful!';
@@ -590,7 +633,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     isNewFilterActive = false;
                     updateNewButtonState();
                     updateChannelList(result.channels);
-                    updateTagFilters(result.unique_tags);
+                    updateTagFilters(result.unique_tags, result.tag_facets);
                     // Reset filter visually and logically
                     tagFilterList.querySelectorAll('.tag-filter').forEach(button => button.classList.remove('selected', 'multi-selected'));
                     tagFilterList.querySelector('.tag-filter[data-tag="all"]')?.classList.add('selected');
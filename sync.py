@@ -0,0 +1,443 @@
+import logging
+import os
+import random
+import socket
+import statistics
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import database as db
+import thumbnail_cache as thumbs
+import youtube_api as yt
+import youtube_feeds as feeds
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Jobs that spend API quota hold a DB lease so only one worker runs each at a time.
+JOB_LEASE_TTL_SECONDS = 15 * 60
+SUBSCRIPTION_SYNC_JOB = 'subscription_sync'
+FAVORITES_REFRESH_JOB = 'favorites_refresh'
+BACKGROUND_REFRESHER_JOB = 'background_refresher'
+BACKGROUND_REFRESH_INTERVAL_SECONDS = int(os.environ.get('BACKGROUND_REFRESH_INTERVAL_SECONDS', 0))
+BACKGROUND_REFRESHER_TICK_SECONDS = 60
+# Adaptive polling: a favorite channel is re-checked after a fraction of its typical gap
+# between uploads, clamped to [min, max], so busy channels are polled often and dormant ones rarely.
+FAVORITE_POLL_MIN_INTERVAL_SECONDS = int(os.environ.get('FAVORITE_POLL_MIN_INTERVAL_SECONDS', 3600))
+FAVORITE_POLL_MAX_INTERVAL_SECONDS = int(os.environ.get('FAVORITE_POLL_MAX_INTERVAL_SECONDS', 7 * 24 * 3600))
+FAVORITE_POLL_GAP_FRACTION = 0.25
+UPLOAD_HISTORY_SIZE = 20
+# How favorites refreshes discover new uploads: 'api' lists the uploads playlist through the
+# Data API; 'feed' reads the public Atom feed (no quota) and only uses the API for durations.
+FAVORITES_DISCOVERY_BACKEND = os.environ.get('FAVORITES_DISCOVERY_BACKEND', 'api')
+DISCOVERY_BACKENDS = {
+    'api': yt.get_new_videos_for_channel,
+    'feed': feeds.get_new_videos_for_channel,
+}
+if FAVORITES_DISCOVERY_BACKEND not in DISCOVERY_BACKENDS:
+    logging.warning(f"Unknown FAVORITES_DISCOVERY_BACKEND '{FAVORITES_DISCOVERY_BACKEND}', using 'api'.")
+    FAVORITES_DISCOVERY_BACKEND = 'api'
+
+
+def _lease_owner():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def _with_job_lease(job_name, events):
+    """Runs an event generator only while holding `job_name`'s lease, renewing it on every event.
+
+    If another worker holds the lease, yields a single `busy` event instead. If a renewal
+    fails (the lease expired and another worker took it), the job stops with an `error` event.
+    """
+    owner = f"{_lease_owner()}:{uuid.uuid4().hex}"
+    if not db.acquire_job_lease(job_name, owner, JOB_LEASE_TTL_SECONDS):
+        logging.info(f"Job '{job_name}' is already running in another worker; skipping.")
+        yield {"event": "busy", "message": "Ya hay una actualización en curso. Probá de nuevo en unos minutos."}
+        return
+    try:
+        for event in events:
+            if not db.acquire_job_lease(job_name, owner, JOB_LEASE_TTL_SECONDS):
+                logging.warning(f"Job '{job_name}' lost its lease to another worker; stopping.")
+                yield {"event": "error", "message": "Lost the job lease to another worker; stopping."}
+                return
+            yield event
+    finally:
+        events.close()
+        db.release_job_lease(job_name, owner)
+
+
+def iter_subscription_sync(youtube_service):
+    """Streams a subscription sync, writing each API page to the DB as it arrives.
+
+    Yields progress events (dicts with an `event` key): one `page` event per page,
+    then a final `done` event, or an `error` event if the API fetch or a DB write
+    failed (`busy` if another worker is already syncing). Channels that are no
+    longer subscribed are removed only after every page was stored, so a failed
+    sync never deletes anything.
+    """
+    return _with_job_lease(SUBSCRIPTION_SYNC_JOB, _iter_subscription_sync(youtube_service))
+
+
+def _iter_subscription_sync(youtube_service):
+    if not db.begin_subscription_sync():
+        yield {"event": "error", "message": "Failed to start subscription sync in database."}
+        return
+
+    pages = 0
+    fetched = 0
+    new_channel_ids = []
+
+    for page in yt.iter_subscription_pages(youtube_service):
+        if page is None:
+            api_error = yt.get_last_api_error() or {}
+            yield {
+                "event": "error",
+                "message": yt.build_user_facing_error_message(
+                    "Failed to fetch subscriptions from YouTube API.",
+                    error_context='subscriptions'
+                ),
+                "error_reason": api_error.get('reason'),
+                "error_status": api_error.get('status')
+            }
+            return
+
+        page_new_ids = db.upsert_subscription_page(page)
+        if page_new_ids is None:
+            yield {"event": "error", "message": "Failed to store subscriptions in database."}
+            return
+
+        pages += 1
+        fetched += len(page)
+        new_channel_ids.extend(page_new_ids)
+        thumbs.prefetch_thumbnails_async(channel['thumbnail_url'] for channel in page)
+        yield {"event": "page", "pages": pages, "fetched": fetched, "added": len(new_channel_ids)}
+
+    deleted_ids = db.finish_subscription_sync()
+    if deleted_ids is None:
+        yield {"event": "error", "message": "Failed to remove unsubscribed channels from database."}
+        return
+
+    logging.info(
+        f"Subscription sync complete: {fetched} channels over {pages} pages, "
+        f"{len(new_channel_ids)} new, {len(deleted_ids)} removed."
+    )
+    yield {
+        "event": "done",
+        "pages": pages,
+        "fetched": fetched,
+        "added": len(new_channel_ids),
+        "removed": len(deleted_ids),
+        "new_channel_ids": new_channel_ids
+    }
+
+
+def run_subscription_sync(youtube_service):
+    """Runs a subscription sync to completion and returns its final `done`, `error` or `busy` event."""
+    result = None
+    for result in iter_subscription_sync(youtube_service):
+        pass
+    return result
+
+
+def plan_subscription_sync(youtube_service):
+    """Dry run of a subscription sync: fetches every page but writes nothing.
+
+    Returns a `plan` event with the channels a real sync would add and remove,
+    or an `error` event if the API fetch failed.
+    """
+    known_channel_ids = db.get_all_channel_ids()
+    subscribed_ids = set()
+    pages = 0
+    for page in yt.iter_subscription_pages(youtube_service):
+        if page is None:
+            api_error = yt.get_last_api_error() or {}
+            return {
+                "event": "error",
+                "message": yt.build_user_facing_error_message(
+                    "Failed to fetch subscriptions from YouTube API.",
+                    error_context='subscriptions'
+                ),
+                "error_reason": api_error.get('reason'),
+                "error_status": api_error.get('status')
+            }
+        pages += 1
+        subscribed_ids.update(channel['channel_id'] for channel in page)
+
+    return {
+        "event": "plan",
+        "pages": pages,
+        "fetched": len(subscribed_ids),
+        "would_add": sorted(subscribed_ids - known_channel_ids),
+        "would_remove": sorted(known_channel_ids - subscribed_ids)
+    }
+
+
+def iter_favorites_refresh(youtube_service, retry_stale_only=False, min_rating=db.FAVORITE_MIN_RATING, force_full_check=False, backend=None):
+    """Refreshes favorite channels one by one, yielding a `channel` event as each one completes.
+
+    Only channels that are due under adaptive polling are fetched, unless
+    `force_full_check` is set. A `channel` event carries the channel's fresh videos,
+    or `stale: true` when its fetch failed and the cached videos were kept. The final
+    `done` event summarizes the run (refreshed/not due/failed channels, warning
+    message, stale channel IDs). Yields a single `busy` event if another worker is
+    already refreshing favorites. `backend` overrides FAVORITES_DISCOVERY_BACKEND.
+    """
+    return _with_job_lease(
+        FAVORITES_REFRESH_JOB,
+        _iter_favorites_refresh(
+            youtube_service,
+            retry_stale_only=retry_stale_only,
+            min_rating=min_rating,
+            force_full_check=force_full_check,
+            backend=backend
+        )
+    )
+
+
+def _parse_iso(timestamp):
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+
+
+def _format_iso(moment):
+    return moment.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+
+
+def _merge_upload_history(previous, fetched):
+    """Newest-first, de-duplicated upload timestamps, capped at UPLOAD_HISTORY_SIZE."""
+    return sorted(set(previous) | set(fetched), reverse=True)[:UPLOAD_HISTORY_SIZE]
+
+
+def _estimate_poll_interval(upload_history, now):
+    """Seconds until a channel with this upload history should be polled again."""
+    uploads = sorted(filter(None, map(_parse_iso, upload_history)), reverse=True)
+    if not uploads:
+        return FAVORITE_POLL_MAX_INTERVAL_SECONDS
+    gaps = [(newer - older).total_seconds() for newer, older in zip(uploads, uploads[1:])]
+    typical_gap = statistics.median(gaps) if gaps else 0
+    # A channel silent for longer than its usual gap is slowing down; back off accordingly.
+    typical_gap = max(typical_gap, (now - uploads[0]).total_seconds())
+    interval = typical_gap * FAVORITE_POLL_GAP_FRACTION
+    return int(min(FAVORITE_POLL_MAX_INTERVAL_SECONDS, max(FAVORITE_POLL_MIN_INTERVAL_SECONDS, interval)))
+
+
+def _plan_favorites_refresh(favorite_channels, channel_states, last_check, retry_stale_only,
+                            force_full_check=False, now_iso=None):
+    """Splits favorite channels into those this refresh should poll and those not due yet.
+
+    Returns (due, not_due): `due` holds (channel, published_after) pairs. Stale channels
+    are always due; `force_full_check` makes every channel due regardless of its schedule.
+    """
+    now_iso = now_iso or yt.utc_now_iso()
+    due = []
+    not_due = []
+    for channel in favorite_channels:
+        state = channel_states.get(channel['channel_id'], {})
+        if retry_stale_only and not state.get('is_stale'):
+            continue
+        next_check_at = state.get('next_check_at')
+        if not force_full_check and not state.get('is_stale') and next_check_at and next_check_at > now_iso:
+            not_due.append(channel)
+            continue
+        # A channel with state keeps its own window, even an unbounded one (None) recorded by
+        # a failed first run; only channels never seen before start from the global last check.
+        due.append((channel, state.get('last_checked_at') if state else last_check))
+    return due, not_due
+
+
+def plan_favorites_refresh(retry_stale_only=False, min_rating=db.FAVORITE_MIN_RATING, force_full_check=False):
+    """Dry run of a favorites refresh: lists the channels it would poll, without API calls or writes."""
+    favorite_channels = db.get_favorite_channels(min_rating=min_rating)
+    channel_states = db.get_favorite_channel_states()
+    due, not_due = _plan_favorites_refresh(
+        favorite_channels,
+        channel_states,
+        db.get_last_favorites_check(),
+        retry_stale_only,
+        force_full_check=force_full_check
+    )
+    return {
+        "event": "plan",
+        "favorite_channels": len(favorite_channels),
+        "channels": [
+            {"channel_id": channel['channel_id'], "channel_title": channel['title'], "published_after": published_after}
+            for channel, published_after in due
+        ],
+        "not_due": [
+            {
+                "channel_id": channel['channel_id'],
+                "channel_title": channel['title'],
+                "next_check_at": channel_states[channel['channel_id']]['next_check_at']
+            }
+            for channel in not_due
+        ]
+    }
+
+
+def _iter_favorites_refresh(youtube_service, retry_stale_only=False, min_rating=db.FAVORITE_MIN_RATING, force_full_check=False,
+                            backend=None):
+    get_new_videos = DISCOVERY_BACKENDS[backend or FAVORITES_DISCOVERY_BACKEND]
+    favorite_channels = db.get_favorite_channels(min_rating=min_rating)
+    last_check = db.get_last_favorites_check()
+    # Pruning and the global last check follow the app-wide favorites definition, so a narrower
+    # `min_rating` run neither drops the other favorites' cache and state nor skips their window.
+    covers_all_favorites = min_rating <= db.FAVORITE_MIN_RATING
+    kept_channels = favorite_channels if covers_all_favorites else db.get_favorite_channels()
+    db.prune_favorite_video_cache([channel['channel_id'] for channel in kept_channels])
+    channel_states = db.get_favorite_channel_states()
+    plan, not_due = _plan_favorites_refresh(
+        favorite_channels, channel_states, last_check, retry_stale_only, force_full_check=force_full_check
+    )
+
+    checked_at = yt.utc_now_iso()
+    now = _parse_iso(checked_at)
+    refreshed_channel_ids = []
+    failed_channel_ids = []
+    last_api_error = None
+    quota_exhausted = False
+
+    for channel, published_after in plan:
+        if quota_exhausted:
+            failed_channel_ids.append(channel['channel_id'])
+            db.mark_favorite_channel_stale(channel['channel_id'], last_api_error.get('message'), published_after)
+            yield {"event": "channel", "channel_id": channel['channel_id'], "channel_title": channel['title'], "stale": True}
+            continue
+
+        fetched_uploads = []
+        channel_videos, api_error = yt.call_with_api_error(
+            get_new_videos,
+            youtube_service,
+            channel_id=channel['channel_id'],
+            channel_title=channel['title'],
+            published_after=published_after,
+            max_pages=3,
+            upload_history=fetched_uploads
+        )
+        if channel_videos is None:
+            failed_channel_ids.append(channel['channel_id'])
+            last_api_error = api_error or last_api_error
+            db.mark_favorite_channel_stale(channel['channel_id'], (api_error or {}).get('message'), published_after)
+            # Every further call would fail the same way; keep the rest on cache.
+            quota_exhausted = bool(api_error and api_error.get('reason') == 'quotaExceeded')
+            yield {"event": "channel", "channel_id": channel['channel_id'], "channel_title": channel['title'], "stale": True}
+            continue
+
+        upload_history = _merge_upload_history(
+            channel_states.get(channel['channel_id'], {}).get('upload_history', []),
+            fetched_uploads
+        )
+        next_check_at = _format_iso(now + timedelta(seconds=_estimate_poll_interval(upload_history, now)))
+        db.replace_favorite_videos_for_channel(
+            channel['channel_id'], channel_videos, checked_at,
+            next_check_at=next_check_at, upload_history=upload_history
+        )
+        refreshed_channel_ids.append(channel['channel_id'])
+        yield {
+            "event": "channel",
+            "channel_id": channel['channel_id'],
+            "channel_title": channel['title'],
+            "stale": False,
+            "videos": channel_videos
+        }
+
+    warning_message = None
+    if failed_channel_ids:
+        warning_message = yt.build_user_facing_error_message(
+            f"No se pudieron actualizar {len(failed_channel_ids)} de {len(favorite_channels)} canales. "
+            "Para esos canales se muestra el último resultado cacheado.",
+            error_context='favorite_videos',
+            details=last_api_error
+        )
+    if refreshed_channel_ids and covers_all_favorites:
+        db.set_last_favorites_check(checked_at)
+    db.enforce_favorite_video_retention(refreshed_channel_ids)
+    db.compact_database_if_needed()
+
+    yield {
+        "event": "done",
+        "refreshed": len(refreshed_channel_ids),
+        "not_due": len(not_due),
+        "failed_channel_ids": failed_channel_ids,
+        "warning_message": warning_message,
+        "stale_channel_ids": db.get_stale_favorite_channel_ids(),
+        "last_check": last_check
+    }
+
+
+def run_favorites_refresh(youtube_service, retry_stale_only=False, min_rating=db.FAVORITE_MIN_RATING, force_full_check=False, backend=None):
+    """Runs a favorites refresh to completion and returns its final `done` (or `busy`) event."""
+    result = None
+    for result in iter_favorites_refresh(
+        youtube_service,
+        retry_stale_only=retry_stale_only,
+        min_rating=min_rating,
+        force_full_check=force_full_check,
+        backend=backend
+    ):
+        pass
+    return result
+
+
+def get_headless_service():
+    """YouTube service for jobs running without a browser, or None if the saved token is missing or unusable.
+
+    Never starts the interactive OAuth flow: the token must already exist.
+    """
+    service = yt.get_service_from_saved_token()
+    if not service:
+        logging.warning("Could not build YouTube service from the saved token.")
+    return service
+
+
+def _run_background_refresh():
+    service = get_headless_service()
+    if not service:
+        logging.info("Background refresh skipped.")
+        return
+    result = run_subscription_sync(service)
+    logging.info(f"Background subscription sync finished: {result.get('event')}.")
+    result = run_favorites_refresh(service)
+    logging.info(f"Background favorites refresh finished: {result.get('event')}.")
+    # Databases created before incremental auto_vacuum need one full VACUUM, done here rather than in a request.
+    if not db.uses_incremental_vacuum():
+        db.vacuum_database()
+
+
+def _background_refresher_loop(interval_seconds):
+    owner = _lease_owner()
+    lease_ttl = BACKGROUND_REFRESHER_TICK_SECONDS * 3
+    while True:
+        # Jitter keeps workers from hitting the lease row at the same instant.
+        time.sleep(BACKGROUND_REFRESHER_TICK_SECONDS + random.uniform(0, 5))
+        try:
+            if not db.acquire_job_lease(BACKGROUND_REFRESHER_JOB, owner, lease_ttl):
+                continue
+            last_run = float(db.get_app_state('background_refresh_last_run', '0') or 0)
+            if time.time() - last_run < interval_seconds:
+                continue
+            db.set_app_state('background_refresh_last_run', str(time.time()))
+            _run_background_refresh()
+        except Exception as e:
+            logging.error(f"Background refresher error: {e}")
+
+
+def start_background_refresher(interval_seconds=BACKGROUND_REFRESH_INTERVAL_SECONDS):
+    """Starts the periodic refresher thread in this worker (no-op if the interval is 0).
+
+    Every worker may call this; a DB lease elects a single leader that actually runs
+    the jobs, and another worker takes over if the leader dies and its lease expires.
+    """
+    if interval_seconds <= 0:
+        return None
+    thread = threading.Thread(
+        target=_background_refresher_loop,
+        args=(interval_seconds,),
+        name='background-refresher',
+        daemon=True
+    )
+    thread.start()
+    logging.info(f"Background refresher started (interval {interval_seconds}s).")
+    return thread
@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# database.py initializes subscriptions.db in the working directory on import; keep it out of the repo.
+os.chdir(tempfile.mkdtemp(prefix='subscription-tagger-tests-'))
+
+import database as db  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """Points `database` at an empty SQLite file and initializes the schema."""
+    monkeypatch.setattr(db, 'DATABASE_NAME', str(tmp_path / 'subscriptions.db'))
+    db._version_cache.clear()
+    db.init_db()
+    yield db
+    db._version_cache.clear()
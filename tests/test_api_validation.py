@@ -0,0 +1,40 @@
+import pytest
+
+import app as web
+
+
+@pytest.fixture
+def client(fresh_db):
+    fresh_db.add_or_update_channel('c1', 'One', None)
+    return web.app.test_client()
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/rating/bulk', ['c1']),
+    ('/api/tags/rename', ['a', 'b']),
+    ('/api/tags/merge', ['a']),
+    ('/api/tags/delete', ['a']),
+    ('/api/tags/bulk', ['c1']),
+    ('/api/tags/bulk', {'channel_ids': ['c1'], 'add': 5}),
+    ('/api/tags/merge', {'sources': 5, 'target': 'x'}),
+    ('/api/tags/c1', {'tags': 5}),
+    ('/api/tags/c1', ['tags']),
+    ('/api/tags/color/a', {'color': 5}),
+    ('/api/rating/c1', {'rating': True}),
+    ('/api/rating/bulk', {'channel_ids': ['c1'], 'rating': True}),
+])
+def test_malformed_json_is_rejected_with_400(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_boolean_rating_does_not_set_one_star(client, fresh_db):
+    client.post('/api/rating/c1', json={'rating': True})
+    assert fresh_db.get_channel('c1')['rating'] is None
+
+
+def test_valid_bulk_tag_update_still_works(client, fresh_db):
+    response = client.post('/api/tags/bulk', json={'channel_ids': ['c1'], 'add': 'a, b'})
+    assert response.status_code == 200
+    assert fresh_db.get_channel('c1')['tags'] == ['a', 'b']
@@ -0,0 +1,48 @@
+import sqlite3
+
+
+def _fill_and_delete(db, rows=3000):
+    conn = sqlite3.connect(db.DATABASE_NAME)
+    conn.executemany(
+        'INSERT INTO channels (channel_id, title, tags) VALUES (?, ?, ?)',
+        [(f'c{i}', 'x' * 500, '[]') for i in range(rows)]
+    )
+    conn.execute('DELETE FROM channels')
+    conn.commit()
+    conn.close()
+
+
+def _pragma(db, name):
+    conn = sqlite3.connect(db.DATABASE_NAME)
+    try:
+        return conn.execute(f'PRAGMA {name}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_request_path_only_runs_a_bounded_incremental_vacuum(fresh_db, monkeypatch):
+    monkeypatch.setattr(fresh_db, 'VACUUM_MIN_FREE_PAGES', 200)
+    _fill_and_delete(fresh_db)
+    free_pages = _pragma(fresh_db, 'freelist_count')
+    assert free_pages > fresh_db.VACUUM_MIN_FREE_PAGES
+
+    assert fresh_db.compact_database_if_needed(max_pages=100)
+    assert _pragma(fresh_db, 'freelist_count') == free_pages - 100
+
+
+def test_legacy_file_is_left_for_the_full_vacuum(fresh_db, monkeypatch):
+    monkeypatch.setattr(fresh_db, 'VACUUM_MIN_FREE_PAGES', 200)
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    conn.execute('PRAGMA auto_vacuum=NONE')
+    conn.execute('VACUUM')
+    conn.close()
+    _fill_and_delete(fresh_db)
+    free_pages = _pragma(fresh_db, 'freelist_count')
+
+    assert not fresh_db.compact_database_if_needed()
+    assert _pragma(fresh_db, 'freelist_count') == free_pages
+    assert not fresh_db.uses_incremental_vacuum()
+
+    assert fresh_db.vacuum_database()
+    assert fresh_db.uses_incremental_vacuum()
+    assert _pragma(fresh_db, 'freelist_count') == 0
@@ -0,0 +1,45 @@
+import sqlite3
+
+
+def _version(db):
+    return int(db.get_data_version())
+
+
+def test_bulk_write_bumps_data_version_once(fresh_db):
+    for channel_id in ('c1', 'c2', 'c3'):
+        fresh_db.add_or_update_channel(channel_id, channel_id.upper(), None)
+    before = _version(fresh_db)
+
+    fresh_db.bulk_update_channel_tags(['c1', 'c2', 'c3'], add_tags=['a'])
+    assert _version(fresh_db) == before + 1
+
+    fresh_db.bulk_update_channel_rating(['c1', 'c2', 'c3'], 4)
+    assert _version(fresh_db) == before + 2
+
+
+def test_write_without_changes_keeps_data_version(fresh_db):
+    fresh_db.add_or_update_channel('c1', 'One', None)
+    before = _version(fresh_db)
+
+    fresh_db.add_or_update_channel('c1', 'One', None)
+    fresh_db.bulk_update_channel_tags(['c1'], remove_tags=['missing'])
+    fresh_db.delete_channel('missing')
+    fresh_db.enforce_favorite_video_retention()
+    assert _version(fresh_db) == before
+
+
+def test_per_row_triggers_are_dropped(fresh_db):
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    conn.execute('''
+        CREATE TRIGGER bump_data_version_channels_insert AFTER INSERT ON channels
+        BEGIN UPDATE app_state SET value = CAST(value AS INTEGER) + 1 WHERE key = 'data_version'; END
+    ''')
+    conn.commit()
+    conn.close()
+
+    fresh_db.init_db()
+
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")]
+    conn.close()
+    assert not [name for name in names if name.startswith('bump_data_version_')]
@@ -0,0 +1,49 @@
+import sync
+
+CHANNEL = {'channel_id': 'c1', 'title': 'One'}
+
+
+def _published_after(states, last_check):
+    due, _ = sync._plan_favorites_refresh([CHANNEL], states, last_check, retry_stale_only=False,
+                                          now_iso='2030-01-02T00:00:00Z')
+    return due[0][1]
+
+
+def test_new_channel_starts_from_global_last_check():
+    assert _published_after({}, '2030-01-01T00:00:00Z') == '2030-01-01T00:00:00Z'
+
+
+def test_stale_channel_retries_its_own_window():
+    stale = {'c1': {'is_stale': True, 'last_checked_at': '2029-12-01T00:00:00Z'}}
+    assert _published_after(stale, '2030-01-01T00:00:00Z') == '2029-12-01T00:00:00Z'
+
+
+def test_channel_that_failed_its_first_run_keeps_an_unbounded_window():
+    stale = {'c1': {'is_stale': True, 'last_checked_at': None}}
+    assert _published_after(stale, '2030-01-01T00:00:00Z') is None
+
+
+def test_failed_first_run_records_the_window_in_effect(fresh_db):
+    fresh_db.mark_favorite_channel_stale('c1', 'boom', '2029-12-01T00:00:00Z')
+    fresh_db.mark_favorite_channel_stale('c1', 'boom again', '2030-01-01T00:00:00Z')
+    assert fresh_db.get_favorite_channel_states()['c1']['last_checked_at'] == '2029-12-01T00:00:00Z'
+
+
+def test_narrower_min_rating_keeps_other_favorites(fresh_db, monkeypatch):
+    for channel_id, rating in (('four', 4), ('five', 5)):
+        fresh_db.add_or_update_channel(channel_id, channel_id, None)
+        fresh_db.update_channel_rating(channel_id, rating)
+    video = {
+        'video_id': 'v4', 'channel_title': 'four', 'title': 'Video', 'published_at': '2030-01-01T00:00:00Z',
+        'thumbnail_url': None, 'video_url': 'https://www.youtube.com/watch?v=v4', 'duration_text': '1:00'
+    }
+    fresh_db.replace_favorite_videos_for_channel('four', [video], '2030-01-01T00:00:00Z')
+    fresh_db.set_last_favorites_check('2030-01-01T00:00:00Z')
+    monkeypatch.setitem(sync.DISCOVERY_BACKENDS, 'api', lambda service, **kwargs: [])
+
+    result = sync.run_favorites_refresh(object(), min_rating=5, backend='api')
+
+    assert result['event'] == 'done' and result['refreshed'] == 1
+    assert 'four' in fresh_db.get_favorite_channel_states()
+    assert [v['video_id'] for v in fresh_db.get_favorite_video_cache('date_desc')] == ['v4']
+    assert fresh_db.get_last_favorites_check() == '2030-01-01T00:00:00Z'
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+import cli
+
+
+def _write_export(tmp_path, db, lines, header=None):
+    if header is None:
+        header = {'type': 'meta', 'format': db.EXPORT_FORMAT, 'version': db.EXPORT_FORMAT_VERSION}
+    path = tmp_path / 'export.ndjson'
+    path.write_text('\n'.join([json.dumps(header)] + [json.dumps(line) for line in lines]) + '\n')
+    return str(path)
+
+
+@pytest.mark.parametrize('record', [
+    [1, 2],
+    {'type': 'channel', 'channel_id': 5, 'title': 'x'},
+    {'type': 'channel', 'channel_id': 'c1', 'title': 'x', 'tags': 'abc'},
+    {'type': 'channel', 'channel_id': 'c1', 'title': 'x', 'tags': ['a', 1]},
+    {'type': 'channel', 'channel_id': 'c1', 'title': 'x', 'rating': 9},
+    {'type': 'channel', 'channel_id': 'c1', 'title': 'x', 'rating': True},
+])
+def test_malformed_record_fails_cleanly_with_line_number(fresh_db, tmp_path, caplog, record):
+    good = {'type': 'channel', 'channel_id': 'c0', 'title': 'ok', 'tags': ['a'], 'rating': 4}
+    path = _write_export(tmp_path, fresh_db, [good, record])
+
+    assert cli.main(['import', path]) == 1
+    assert 'line 3' in caplog.text
+    assert fresh_db.get_channel('c0') is None
+
+
+def test_non_integer_header_version_is_rejected(fresh_db, tmp_path):
+    header = {'type': 'meta', 'format': fresh_db.EXPORT_FORMAT, 'version': '2'}
+    assert cli.main(['import', _write_export(tmp_path, fresh_db, [], header=header)]) == 1
+
+
+def test_valid_record_is_imported(fresh_db, tmp_path):
+    record = {'type': 'channel', 'channel_id': 'c1', 'title': 'x', 'tags': ['a'], 'rating': 5}
+    assert cli.main(['import', _write_export(tmp_path, fresh_db, [record])]) == 0
+    assert fresh_db.get_channel('c1')['tags'] == ['a']
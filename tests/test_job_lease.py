@@ -0,0 +1,41 @@
+import app as web
+import sync
+
+
+def test_job_stops_when_its_lease_is_taken(fresh_db):
+    steps = []
+
+    def job():
+        steps.append(1)
+        yield {"event": "page"}
+        # The lease expired and another worker took it over.
+        conn = fresh_db.get_db_connection()
+        conn.execute("UPDATE job_leases SET owner = 'other-worker', expires_at = 1e12 WHERE job_name = 'test_job'")
+        conn.commit()
+        conn.close()
+        steps.append(2)
+        yield {"event": "page"}
+        steps.append(3)
+        yield {"event": "done"}
+
+    events = list(sync._with_job_lease('test_job', job()))
+
+    assert [event['event'] for event in events] == ['page', 'error']
+    assert steps == [1, 2]
+
+
+def test_wsgi_routes_never_start_the_oauth_flow(fresh_db, monkeypatch):
+    monkeypatch.setitem(web.app.config, 'INTERACTIVE_OAUTH', False)
+    monkeypatch.setattr(web.yt, 'get_service_from_saved_token', lambda: None)
+
+    def interactive_flow():
+        raise AssertionError("interactive OAuth flow started")
+
+    monkeypatch.setattr(web.yt, 'get_authenticated_service', interactive_flow)
+    client = web.app.test_client()
+
+    assert client.get('/').status_code == 401
+    assert client.get('/nuevos-favoritos').status_code == 401
+    assert client.get('/nuevos-favoritos/stream').status_code == 401
+    assert client.post('/refresh_from_youtube').status_code == 401
+    assert client.post('/refresh_from_youtube/stream').status_code == 401
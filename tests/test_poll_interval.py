@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta, timezone
+
+import sync
+
+NOW = datetime(2030, 1, 31, tzinfo=timezone.utc)
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+def _history(*ages):
+    return [sync._format_iso(NOW - timedelta(seconds=age)) for age in ages]
+
+
+def test_no_history_polls_at_the_maximum_interval():
+    assert sync._estimate_poll_interval([], NOW) == sync.FAVORITE_POLL_MAX_INTERVAL_SECONDS
+
+
+def test_interval_is_a_fraction_of_the_typical_gap():
+    history = _history(0, 2 * DAY, 4 * DAY, 6 * DAY)
+    assert sync._estimate_poll_interval(history, NOW) == int(2 * DAY * sync.FAVORITE_POLL_GAP_FRACTION)
+
+
+def test_busy_channel_is_clamped_to_the_minimum_interval():
+    history = _history(0, 600, 1200, 1800)
+    assert sync._estimate_poll_interval(history, NOW) == sync.FAVORITE_POLL_MIN_INTERVAL_SECONDS
+
+
+def test_dormant_channel_is_clamped_to_the_maximum_interval():
+    history = _history(200 * DAY, 230 * DAY, 260 * DAY)
+    assert sync._estimate_poll_interval(history, NOW) == sync.FAVORITE_POLL_MAX_INTERVAL_SECONDS
+
+
+def test_channel_gone_quiet_backs_off_beyond_its_usual_gap():
+    daily = sync._estimate_poll_interval(_history(0, DAY, 2 * DAY, 3 * DAY), NOW)
+    quiet = sync._estimate_poll_interval(_history(10 * DAY, 11 * DAY, 12 * DAY, 13 * DAY), NOW)
+    assert daily == int(DAY * sync.FAVORITE_POLL_GAP_FRACTION)
+    assert quiet == int(10 * DAY * sync.FAVORITE_POLL_GAP_FRACTION)
+
+
+def test_unparseable_timestamps_are_ignored():
+    history = ['garbage', None, *_history(0, 2 * DAY)]
+    assert sync._estimate_poll_interval(history, NOW) == int(2 * DAY * sync.FAVORITE_POLL_GAP_FRACTION)
+
+
+def test_fresh_database_needs_no_polling_migration(fresh_db, tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr(fresh_db, 'DATABASE_NAME', str(tmp_path / 'new.db'))
+    caplog.set_level('INFO')
+    fresh_db.init_db()
+    assert 'Database initialized successfully.' in caplog.text
+    assert 'Adding adaptive polling columns' not in caplog.text
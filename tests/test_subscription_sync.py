@@ -0,0 +1,43 @@
+import functools
+
+import sync
+import youtube_api as yt
+
+
+class _Request:
+    def __init__(self, payload):
+        self.methodId = 'youtube.subscriptions.list'
+        self.payload = payload
+
+    def execute(self):
+        return self.payload
+
+
+class _EndlessSubscriptions:
+    """Fake service whose subscription list never runs out of pages."""
+
+    def subscriptions(self):
+        return self
+
+    def list(self, pageToken=None, **kwargs):
+        page = int(pageToken or 0)
+        item = {'snippet': {'resourceId': {'channelId': f'c{page}'}, 'title': f'Channel {page}', 'thumbnails': {}}}
+        return _Request({'items': [item], 'nextPageToken': str(page + 1)})
+
+
+def test_page_cap_is_reported_as_failure():
+    pages = list(yt.iter_subscription_pages(_EndlessSubscriptions(), max_pages=2))
+    assert pages[-1] is None
+    assert len(pages) == 3
+    assert yt.get_last_api_error()['context'] == 'subscriptions'
+
+
+def test_truncated_sync_keeps_unseen_channels(fresh_db, monkeypatch):
+    fresh_db.add_or_update_channel('old', 'Old channel', None)
+    monkeypatch.setattr(sync.yt, 'iter_subscription_pages', functools.partial(yt.iter_subscription_pages, max_pages=2))
+    monkeypatch.setattr(sync.thumbs, 'prefetch_thumbnails_async', lambda urls: None)
+
+    result = sync.run_subscription_sync(_EndlessSubscriptions())
+
+    assert result['event'] == 'error'
+    assert fresh_db.get_channel('old') is not None
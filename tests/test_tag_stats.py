@@ -0,0 +1,112 @@
+import sqlite3
+
+
+def _expected_facets(db):
+    """Facet counts computed from scratch with GROUP BY over `channels`."""
+    conn = sqlite3.connect(db.DATABASE_NAME)
+    try:
+        tags = dict(conn.execute('''
+            SELECT tag.value, COUNT(DISTINCT channels.channel_id)
+            FROM channels, json_each(channels.tags) AS tag
+            GROUP BY tag.value
+        ''').fetchall())
+        untagged = conn.execute("SELECT COUNT(1) FROM channels WHERE json_array_length(tags) = 0").fetchone()[0]
+        ratings = dict(conn.execute('''
+            SELECT COALESCE(CAST(rating AS TEXT), 'none'), COUNT(1)
+            FROM channels
+            GROUP BY COALESCE(CAST(rating AS TEXT), 'none')
+        ''').fetchall())
+    finally:
+        conn.close()
+    return {'tags': tags, 'untagged': untagged, 'ratings': ratings}
+
+
+def _stored_facets(db):
+    facets = db.get_tag_facets()
+    return {'tags': dict(facets['tags']), 'untagged': facets['untagged'], 'ratings': dict(facets['ratings'])}
+
+
+def _seed(db):
+    for channel_id in ('c1', 'c2', 'c3', 'c4', 'c5'):
+        db.add_or_update_channel(channel_id, channel_id.upper(), None)
+    db.update_channel_tags('c1', ['a', 'b'])
+    db.update_channel_tags('c2', ['a'])
+    db.update_channel_rating('c1', 3)
+    db.update_channel_rating('c2', 3)
+    db.update_channel_rating('c3', 5)
+
+
+def test_insert_and_update_triggers_match_group_by(fresh_db):
+    _seed(fresh_db)
+    assert _stored_facets(fresh_db) == _expected_facets(fresh_db)
+
+    fresh_db.update_channel_tags('c2', ['b', 'c'])
+    fresh_db.update_channel_rating('c3', None)
+    fresh_db.bulk_update_channel_tags(['c4', 'c5'], add_tags=['a'])
+    fresh_db.rename_tag('b', 'bee')
+    assert _stored_facets(fresh_db) == _expected_facets(fresh_db)
+
+
+def test_delete_trigger_matches_group_by(fresh_db):
+    _seed(fresh_db)
+    fresh_db.delete_channel('c1')
+    fresh_db.delete_channel('c3')
+    expected = _expected_facets(fresh_db)
+    assert _stored_facets(fresh_db) == expected
+    assert 'b' not in expected['tags'] and '5' not in expected['ratings']
+
+
+def test_backfill_of_existing_database(fresh_db):
+    _seed(fresh_db)
+    fresh_db.delete_channel('c5')
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    conn.execute('DROP TABLE tag_stats')
+    conn.commit()
+    conn.close()
+
+    fresh_db.init_db()
+    assert _stored_facets(fresh_db) == _expected_facets(fresh_db)
+    assert _stored_facets(fresh_db)['ratings'] == {'3': 2, '5': 1, 'none': 1}
+
+
+def test_rebuild_invalidates_memoized_facets(fresh_db):
+    _seed(fresh_db)
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    conn.execute("UPDATE tag_stats SET channel_count = 99 WHERE facet = 'rating'")
+    conn.commit()
+    conn.close()
+    fresh_db._version_cache.clear()
+    assert _stored_facets(fresh_db)['ratings']['3'] == 99  # now memoized
+
+    assert fresh_db.rebuild_tag_stats()
+    assert _stored_facets(fresh_db) == _expected_facets(fresh_db)
+
+
+def test_rename_and_delete_skip_rows_with_malformed_tags(fresh_db):
+    _seed(fresh_db)
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    conn.execute("UPDATE channels SET tags = 'not json' WHERE channel_id = 'c5'")
+    conn.commit()
+    conn.close()
+
+    assert fresh_db.rename_tag('a', 'alpha') == 2
+    assert fresh_db.delete_tag('b') == 1
+    assert fresh_db.get_channel('c1')['tags'] == ['alpha']
+    assert fresh_db.get_channel('c5')['tags'] == []
+
+
+def test_triggers_only_clean_up_the_facets_they_touched(fresh_db):
+    _seed(fresh_db)
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    conn.execute("INSERT INTO tag_stats (facet, value, channel_count) VALUES ('tag', 'ghost', 0)")
+    conn.commit()
+    conn.close()
+
+    fresh_db.update_channel_tags('c1', ['a'])
+    fresh_db.delete_channel('c3')
+
+    conn = sqlite3.connect(fresh_db.DATABASE_NAME)
+    stored = dict(conn.execute("SELECT facet || ':' || value, channel_count FROM tag_stats").fetchall())
+    conn.close()
+    assert stored['tag:ghost'] == 0
+    assert 'tag:b' not in stored and 'rating:5' not in stored
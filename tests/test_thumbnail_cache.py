@@ -0,0 +1,40 @@
+import os
+import threading
+from concurrent.futures import wait
+
+import thumbnail_cache as thumbs
+
+
+def test_prefetch_skips_cached_thumbnails_without_touching_them(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbs, 'THUMBNAIL_PROXY_ENABLED', True)
+    monkeypatch.setattr(thumbs, 'THUMBNAIL_CACHE_DIR', str(tmp_path))
+    fetched = []
+    monkeypatch.setattr(thumbs, 'fetch_thumbnail', fetched.append)
+
+    data_path, meta_path = thumbs._paths(thumbs.cache_key('http://x/cached'))
+    os.makedirs(os.path.dirname(data_path))
+    for path in (data_path, meta_path):
+        with open(path, 'w') as f:
+            f.write('{}')
+    os.utime(data_path, (1, 1))
+
+    futures = thumbs.prefetch_thumbnails_async(['http://x/cached', 'http://x/new', 'http://x/new', None])
+    wait(futures)
+
+    assert fetched == ['http://x/new']
+    assert os.stat(data_path).st_mtime == 1
+
+
+def test_prefetch_calls_share_one_bounded_pool(tmp_path, monkeypatch):
+    monkeypatch.setattr(thumbs, 'THUMBNAIL_PROXY_ENABLED', True)
+    monkeypatch.setattr(thumbs, 'THUMBNAIL_CACHE_DIR', str(tmp_path))
+    threads = set()
+    monkeypatch.setattr(thumbs, 'fetch_thumbnail', lambda url: threads.add(threading.get_ident()))
+
+    futures = []
+    for page in range(10):
+        futures += thumbs.prefetch_thumbnails_async(f'http://x/{page}-{i}' for i in range(10))
+    wait(futures)
+
+    assert len(futures) == 100
+    assert len(threads) <= thumbs.THUMBNAIL_PREFETCH_WORKERS
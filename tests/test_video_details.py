@@ -0,0 +1,83 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import youtube_api as yt
+
+NOW = datetime(2030, 1, 1, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('duration_iso, expected', [
+    ('PT4M13S', '4:13'),
+    ('PT1H2M3S', '1:02:03'),
+    ('P1DT2H3M4S', '26:03:04'),
+    ('P2D', '48:00:00'),
+    ('P0D', None),
+    ('PT0S', None),
+    ('garbage', None),
+])
+def test_format_duration(duration_iso, expected):
+    assert yt._format_duration(duration_iso) == expected
+
+
+@pytest.mark.parametrize('details, needs_fetch', [
+    (None, True),
+    ({'duration_iso': 'P1DT2H', 'duration_text': '26:00:00', 'live_broadcast_content': 'none'}, False),
+    ({'duration_iso': 'P0D', 'duration_text': None, 'live_broadcast_content': 'none'}, False),
+    ({'duration_iso': 'P0D', 'duration_text': None, 'live_broadcast_content': 'live'}, True),
+    ({'duration_iso': None, 'duration_text': None, 'live_broadcast_content': 'none'}, True),
+])
+def test_only_pending_details_are_refetched(details, needs_fetch):
+    if details:
+        details['fetched_at'] = '2029-12-31T00:00:00Z'
+    assert yt._needs_video_details_fetch(details, NOW) is needs_fetch
+
+
+def test_retention_drops_details_of_uncached_videos(fresh_db):
+    video = {
+        'video_id': 'v1', 'channel_title': 'One', 'title': 'Video', 'published_at': '2030-01-01T00:00:00Z',
+        'thumbnail_url': None, 'video_url': 'https://www.youtube.com/watch?v=v1', 'duration_text': '1:00'
+    }
+    fresh_db.replace_favorite_videos_for_channel('c1', [video], '2030-01-01T00:00:00Z')
+    fresh_db.upsert_video_details([
+        {'video_id': vid, 'duration_iso': 'PT1M', 'duration_text': '1:00',
+         'live_broadcast_content': 'none', 'fetched_at': '2030-01-01T00:00:00Z'}
+        for vid in ('v1', 'gone')
+    ])
+
+    fresh_db.enforce_favorite_video_retention(['c1'], now=NOW)
+
+    assert set(fresh_db.get_video_details(['v1', 'gone'])) == {'v1'}
+
+
+class _Videos:
+    """Fake service whose videos.list only knows 'v1'; every call is recorded."""
+
+    def __init__(self):
+        self.requested = []
+
+    def videos(self):
+        return self
+
+    def list(self, id, **kwargs):
+        self.requested.append(id.split(','))
+        items = [{'id': 'v1', 'contentDetails': {'duration': 'PT1M'}, 'snippet': {'liveBroadcastContent': 'none'}}]
+        return _Request({'items': [item for item in items if item['id'] in id.split(',')]})
+
+
+class _Request:
+    methodId = 'youtube.videos.list'
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def execute(self):
+        return self.payload
+
+
+def test_videos_missing_from_the_api_are_not_requested_again(fresh_db):
+    service = _Videos()
+    assert yt.load_video_durations(service, ['v1', 'private'])['v1'] == '1:00'
+    durations = yt.load_video_durations(service, ['v1', 'private'])
+    assert durations['v1'] == '1:00' and durations.get('private') is None
+    assert service.requested == [['v1', 'private']]
@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+import youtube_api as yt
+import youtube_feeds as feeds
+
+FEED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'feeds')
+
+
+@pytest.fixture
+def local_feeds(monkeypatch):
+    monkeypatch.setattr(feeds, 'YOUTUBE_FEED_URL_TEMPLATE', f'file://{FEED_DIR}/{{channel_id}}.xml')
+
+
+def test_iter_feed_entries_parses_and_normalizes():
+    with open(os.path.join(FEED_DIR, 'UCfeed.xml'), 'rb') as stream:
+        entries = list(feeds.iter_feed_entries(stream))
+
+    assert [entry['video_id'] for entry in entries] == ['new1', 'new2', 'old1']
+    assert entries[0] == {
+        'video_id': 'new1',
+        'title': 'Newest & shiny',
+        'published_at': '2030-01-03T12:00:00Z',
+        'thumbnail_url': 'https://i1.ytimg.com/vi/new1/hqdefault.jpg',
+        'video_url': 'https://www.youtube.com/watch?v=new1'
+    }
+    assert entries[1]['published_at'] == '2030-01-02T12:30:00Z'
+    assert entries[2]['thumbnail_url'] is None
+    assert entries[2]['video_url'] == 'https://www.youtube.com/watch?v=old1'
+
+
+def test_new_videos_after_window_and_full_upload_history(local_feeds):
+    upload_history = []
+    videos = feeds.get_new_videos_for_channel(
+        None, 'UCfeed', 'Feed Channel', published_after='2030-01-01T00:00:00Z', upload_history=upload_history
+    )
+
+    assert [video['video_id'] for video in videos] == ['new1', 'new2']
+    assert all(video['channel_id'] == 'UCfeed' and video['channel_title'] == 'Feed Channel' for video in videos)
+    assert all(video['duration_text'] is None for video in videos)
+    assert upload_history == ['2030-01-03T12:00:00Z', '2030-01-02T12:30:00Z', '2030-01-01T00:00:00Z']
+
+
+def test_without_window_every_entry_is_new(local_feeds):
+    videos = feeds.get_new_videos_for_channel(None, 'UCfeed', 'Feed Channel')
+    assert [video['video_id'] for video in videos] == ['new1', 'new2', 'old1']
+
+
+def test_missing_feed_records_feed_error(local_feeds):
+    assert feeds.get_new_videos_for_channel(None, 'UCmissing', 'Missing') is None
+    error = yt.get_last_api_error()
+    assert error['reason'] == 'feedError' and error['context'] == 'favorite_videos'
+
+
+def test_malformed_feed_records_feed_error(tmp_path, monkeypatch):
+    (tmp_path / 'UCbroken.xml').write_text('<feed><broken')
+    monkeypatch.setattr(feeds, 'YOUTUBE_FEED_URL_TEMPLATE', f'file://{tmp_path}/{{channel_id}}.xml')
+
+    assert feeds.get_new_videos_for_channel(None, 'UCbroken', 'Broken') is None
+    assert yt.get_last_api_error()['reason'] == 'feedError'
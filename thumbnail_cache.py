@@ -0,0 +1,155 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+THUMBNAIL_PROXY_ENABLED = os.environ.get('THUMBNAIL_PROXY_ENABLED', '0') == '1'
+THUMBNAIL_CACHE_DIR = os.environ.get('THUMBNAIL_CACHE_DIR', 'thumbnail_cache')
+THUMBNAIL_CACHE_MAX_BYTES = int(os.environ.get('THUMBNAIL_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+THUMBNAIL_MAX_AGE_SECONDS = 30 * 24 * 3600
+THUMBNAIL_FETCH_TIMEOUT_SECONDS = 10
+THUMBNAIL_PREFETCH_WORKERS = 4
+
+_eviction_lock = threading.Lock()
+# Threads are started on the first submit, up to THUMBNAIL_PREFETCH_WORKERS for the whole process.
+_prefetch_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_PREFETCH_WORKERS, thread_name_prefix='thumbnail-prefetch')
+_prefetch_lock = threading.Lock()
+_prefetch_pending = set()
+# Running estimate of the cache size so eviction only rescans the directory when over budget.
+_approx_cache_bytes = None
+
+
+def cache_key(url):
+    """Stable key for a thumbnail URL; also used as its ETag."""
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _paths(key):
+    base = os.path.join(os.path.abspath(THUMBNAIL_CACHE_DIR), key[:2], key)
+    return base, base + '.json'
+
+
+def get_cached_thumbnail(url):
+    """Returns (path, content_type, key) for a cached thumbnail, or None. Marks it as recently used."""
+    key = cache_key(url)
+    data_path, meta_path = _paths(key)
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as meta_file:
+            meta = json.load(meta_file)
+        os.utime(data_path)
+    except (OSError, ValueError):
+        return None
+    return data_path, meta.get('content_type') or 'image/jpeg', key
+
+
+def fetch_thumbnail(url):
+    """Downloads a thumbnail into the on-disk cache. Returns the same tuple as `get_cached_thumbnail`."""
+    key = cache_key(url)
+    data_path, meta_path = _paths(key)
+    try:
+        with urllib.request.urlopen(url, timeout=THUMBNAIL_FETCH_TIMEOUT_SECONDS) as response:
+            content = response.read()
+            content_type = response.headers.get_content_type()
+    except Exception as e:
+        logging.warning(f"Could not fetch thumbnail {url}: {e}")
+        return None
+
+    try:
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        tmp_path = f"{data_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as data_file:
+            data_file.write(content)
+        os.replace(tmp_path, data_path)
+        with open(meta_path, 'w', encoding='utf-8') as meta_file:
+            json.dump({'url': url, 'content_type': content_type}, meta_file)
+    except OSError as e:
+        logging.warning(f"Could not store thumbnail {url}: {e}")
+        return None
+
+    _record_stored_bytes(len(content), data_path)
+    return data_path, content_type, key
+
+
+def get_or_fetch_thumbnail(url):
+    return get_cached_thumbnail(url) or fetch_thumbnail(url)
+
+
+def _record_stored_bytes(size, stored_path):
+    global _approx_cache_bytes
+    with _eviction_lock:
+        if _approx_cache_bytes is not None:
+            _approx_cache_bytes += size
+            if _approx_cache_bytes <= THUMBNAIL_CACHE_MAX_BYTES:
+                return
+    evict_if_needed(keep_path=stored_path)
+
+
+def evict_if_needed(keep_path=None):
+    """Removes least-recently-used thumbnails (never `keep_path`) until the cache fits in THUMBNAIL_CACHE_MAX_BYTES."""
+    global _approx_cache_bytes
+    with _eviction_lock:
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(os.path.abspath(THUMBNAIL_CACHE_DIR)):
+            for name in files:
+                if name.endswith('.json') or name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total_size += stat.st_size
+
+        if total_size > THUMBNAIL_CACHE_MAX_BYTES:
+            entries.sort()
+            for _, size, path in entries:
+                if path == keep_path:
+                    continue
+                for stale_path in (path, path + '.json'):
+                    try:
+                        os.remove(stale_path)
+                    except OSError:
+                        pass
+                total_size -= size
+                if total_size <= THUMBNAIL_CACHE_MAX_BYTES:
+                    break
+        _approx_cache_bytes = total_size
+
+
+def _is_cached(url):
+    """Existence check for prefetching; unlike `get_cached_thumbnail` it reads nothing and keeps the LRU order."""
+    data_path, meta_path = _paths(cache_key(url))
+    return os.path.exists(meta_path) and os.path.exists(data_path)
+
+
+def _prefetch(url):
+    try:
+        if not _is_cached(url):
+            fetch_thumbnail(url)
+    finally:
+        with _prefetch_lock:
+            _prefetch_pending.discard(url)
+
+
+def prefetch_thumbnails_async(urls):
+    """Queues the given URLs for background download (no-op when the proxy is disabled).
+
+    Every call shares one pool of THUMBNAIL_PREFETCH_WORKERS threads, so a sync that prefetches
+    page by page never downloads more than that many thumbnails at once. Returns the futures queued.
+    """
+    if not THUMBNAIL_PROXY_ENABLED:
+        return None
+
+    with _prefetch_lock:
+        urls = [url for url in dict.fromkeys(urls) if url and url not in _prefetch_pending]
+        _prefetch_pending.update(urls)
+    if urls:
+        logging.info(f"Queued {len(urls)} thumbnails for background prefetch.")
+    return [_prefetch_executor.submit(_prefetch, url) for url in urls]
@@ -0,0 +1,14 @@
+"""WSGI entry point for multi-worker deployments, e.g.:
+
+    gunicorn --workers 4 --threads 4 --timeout 300 wsgi:app
+
+Do not use --preload: each worker must start its own background refresher thread.
+"""
+import database as db
+import sync
+from app import app
+
+# Workers never open the OAuth flow: routes use the saved token or answer 401.
+app.config['INTERACTIVE_OAUTH'] = False
+db.init_db()
+sync.start_background_refresher()
@@ -1,8 +1,12 @@
 import os
+import contextvars
 import logging
 import pickle
 import re
 import json
+import random
+import threading
+import time
 from datetime import datetime, timezone, timedelta
 from zoneinfo import ZoneInfo
 
@@ -11,6 +15,8 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+import database as db
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 SCOPES = ['https://www.googleapis.com/auth/youtube.readonly']
@@ -19,26 +25,60 @@ API_VERSION = 'v3'
 CLIENT_SECRETS_FILE = 'client_secrets.json'
 TOKEN_PICKLE_FILE = 'token.pickle'
 
-_last_api_error = None
-
-
-def _set_last_api_error(status=None, reason=None, message=None, context=None):
-    global _last_api_error
-    _last_api_error = {
+# Client-side throttling and retry policy shared by every Data API call.
+API_REQUESTS_PER_SECOND = 10
+API_BURST_SIZE = 10
+MAX_REQUEST_RETRIES = 5
+RETRY_BASE_DELAY_SECONDS = 1.0
+RETRY_MAX_DELAY_SECONDS = 32.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded', 'backendError', 'internalError'}
+NON_RETRYABLE_REASONS = {'quotaExceeded', 'dailyLimitExceeded'}
+# Data API quota units per call; every method this app uses costs 1 except search.list.
+DEFAULT_QUOTA_COST = 1
+API_QUOTA_COSTS = {'youtube.search.list': 100}
+
+# Durations never change once a video is published, except for live streams and
+# premieres whose duration is still pending; those are re-fetched after this TTL.
+PENDING_VIDEO_DETAILS_TTL_SECONDS = 3600
+PENDING_BROADCAST_STATES = {'live', 'upcoming'}
+# Stored for IDs `videos.list` returns nothing for (private or deleted videos), so they aren't asked for again.
+UNAVAILABLE_BROADCAST_STATE = 'unavailable'
+
+# Per-context error channel: each request thread (or each task run through
+# `call_with_api_error`) sees only the errors raised by its own API calls.
+_last_api_error = contextvars.ContextVar('youtube_last_api_error', default=None)
+
+
+def set_last_api_error(status=None, reason=None, message=None, context=None):
+    """Records the error of the current context; also used by other discovery backends (youtube_feeds)."""
+    _last_api_error.set({
         "status": status,
         "reason": reason,
         "message": message,
         "context": context
-    }
+    })
 
 
 def clear_last_api_error():
-    global _last_api_error
-    _last_api_error = None
+    _last_api_error.set(None)
 
 
 def get_last_api_error():
-    return _last_api_error
+    return _last_api_error.get()
+
+
+def call_with_api_error(func, *args, **kwargs):
+    """Runs `func` in an isolated error context and returns `(result, api_error)`.
+
+    Safe to use from worker threads: concurrent calls never see each other's errors.
+    """
+    def run():
+        clear_last_api_error()
+        result = func(*args, **kwargs)
+        return result, get_last_api_error()
+
+    return contextvars.copy_context().run(run)
 
 
 def _extract_http_error_details(error):
@@ -63,6 +103,96 @@ def _extract_http_error_details(error):
     return status, reason, message
 
 
+class _TokenBucket:
+    """Thread-safe token bucket that blocks callers until a token is available."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+_rate_limiter = _TokenBucket(API_REQUESTS_PER_SECOND, API_BURST_SIZE)
+
+_api_usage = {'calls': 0, 'retries': 0, 'quota_units': 0, 'by_method': {}}
+_api_usage_lock = threading.Lock()
+
+
+def _record_api_call(request, is_retry):
+    method_id = getattr(request, 'methodId', None) or 'unknown'
+    with _api_usage_lock:
+        _api_usage['calls'] += 1
+        _api_usage['retries'] += int(is_retry)
+        _api_usage['quota_units'] += API_QUOTA_COSTS.get(method_id, DEFAULT_QUOTA_COST)
+        _api_usage['by_method'][method_id] = _api_usage['by_method'].get(method_id, 0) + 1
+
+
+def get_api_usage():
+    """Snapshot of the API calls made by this process (calls, retries, estimated quota units, per method).
+
+    Every attempt is counted, retries included, since YouTube charges quota for failed calls too.
+    Diff two snapshots to measure a single job.
+    """
+    with _api_usage_lock:
+        return {**_api_usage, 'by_method': dict(_api_usage['by_method'])}
+
+
+def _is_retryable_http_error(error):
+    status, reason, _ = _extract_http_error_details(error)
+    if reason in NON_RETRYABLE_REASONS:
+        return False
+    if reason in RETRYABLE_REASONS:
+        return True
+    return status in RETRYABLE_STATUS_CODES
+
+
+def _retry_delay(attempt):
+    """Exponential backoff with full jitter for the given (0-based) retry attempt."""
+    ceiling = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+
+def _execute_request(request, max_retries=MAX_REQUEST_RETRIES):
+    """Executes an API request under the shared rate limiter, retrying transient failures.
+
+    Rate-limit and 5xx errors are retried with jittered exponential backoff;
+    `quotaExceeded` and other client errors are raised immediately.
+    """
+    attempt = 0
+    while True:
+        _rate_limiter.acquire()
+        _record_api_call(request, is_retry=attempt > 0)
+        try:
+            return request.execute()
+        except HttpError as e:
+            if attempt >= max_retries or not _is_retryable_http_error(e):
+                raise
+            failure = f"HTTP {getattr(e.resp, 'status', '?')}"
+        except (ConnectionError, TimeoutError) as e:
+            if attempt >= max_retries:
+                raise
+            failure = type(e).__name__
+
+        delay = _retry_delay(attempt)
+        attempt += 1
+        logging.warning(f"Transient YouTube API error ({failure}), retry {attempt}/{max_retries} in {delay:.2f}s.")
+        time.sleep(delay)
+
+
 def _next_quota_reset_hint():
     """Returns a human-friendly hint for YouTube daily quota reset time."""
     try:
@@ -78,8 +208,10 @@ def _next_quota_reset_hint():
     utc_text = next_midnight_utc.strftime("%Y-%m-%d %H:%M UTC")
     return f"Próximo reset estimado: {pt_text} ({utc_text})."
 
-def build_user_facing_error_message(default_message, error_context=None):
-    details = get_last_api_error()
+def build_user_facing_error_message(default_message, error_context=None, details=None):
+    """Builds a message for the given API error details (defaults to the current context's last error)."""
+    if details is None:
+        details = get_last_api_error()
     if not details:
         return default_message
 
@@ -135,6 +267,10 @@ def get_authenticated_service():
                 logging.error(f"Authentication flow failed: {e}")
                 return None
 
+    return _build_service(credentials)
+
+
+def _build_service(credentials):
     try:
         clear_last_api_error()
         youtube_service = build(API_SERVICE_NAME, API_VERSION, credentials=credentials)
@@ -150,20 +286,58 @@ def get_authenticated_service():
         return None
 
 
-def get_all_subscriptions(youtube_service):
-    """Fetches all subscribed channels for the authenticated user."""
-    if not youtube_service:
-        logging.error("YouTube service not authenticated for get_all_subscriptions.")
+def get_service_from_saved_token():
+    """Builds the API service from `token.pickle` only, refreshing the access token if needed.
+
+    Unlike `get_authenticated_service`, this never starts the interactive OAuth flow,
+    so it is safe for cron jobs and background threads. Returns None on any failure.
+    """
+    try:
+        with open(TOKEN_PICKLE_FILE, 'rb') as token:
+            credentials = pickle.load(token)
+    except FileNotFoundError:
+        logging.warning(f"No '{TOKEN_PICKLE_FILE}' yet: open the web app once to authorize.")
+        return None
+    except Exception as e:
+        logging.error(f"Error loading token file: {e}. Open the web app to authorize again.")
         return None
 
-    subscriptions = []
+    if not credentials.valid:
+        if not (credentials.expired and credentials.refresh_token):
+            logging.error("Saved credentials are invalid and can't be refreshed. Open the web app to authorize again.")
+            return None
+        try:
+            credentials.refresh(Request())
+        except Exception as e:
+            logging.error(f"Could not refresh credentials: {e}. Open the web app to authorize again.")
+            return None
+        try:
+            with open(TOKEN_PICKLE_FILE, 'wb') as token:
+                pickle.dump(credentials, token)
+        except Exception as e:
+            logging.warning(f"Could not save refreshed credentials: {e}")
+
+    return _build_service(credentials)
+
+
+def iter_subscription_pages(youtube_service, max_pages=50):
+    """Yields the authenticated user's subscriptions one API page (list of dicts) at a time.
+
+    On failure the API error is recorded and a single `None` is yielded before stopping,
+    so callers can tell a failed stream from a complete one. Hitting `max_pages` is a
+    failure too: the subscription list is incomplete and must not be treated as final.
+    """
+    if not youtube_service:
+        logging.error("YouTube service not authenticated for iter_subscription_pages.")
+        yield None
+        return
+
     clear_last_api_error()
     next_page_token = None
     logging.info("Fetching subscriptions from YouTube API...")
     page_count = 0
-    max_pages = 50
 
-    while True and page_count < max_pages:
+    while page_count < max_pages:
         page_count += 1
         try:
             request_params = {
@@ -177,38 +351,53 @@ def get_all_subscriptions(youtube_service):
             request = youtube_service.subscriptions().list(
                 **request_params
             )
-            response = request.execute()
-
-            for item in response.get('items', []):
-                snippet = item.get('snippet', {})
-                channel_id = snippet.get('resourceId', {}).get('channelId')
-                title = snippet.get('title')
-                thumbnail_url = snippet.get('thumbnails', {}).get('default', {}).get('url')
-
-                if channel_id and title:
-                    subscriptions.append({
-                        'channel_id': channel_id,
-                        'title': title,
-                        'thumbnail_url': thumbnail_url
-                    })
-
-            next_page_token = response.get('nextPageToken')
-            if not next_page_token:
-                break
-
+            response = _execute_request(request)
         except HttpError as e:
             status, reason, message = _extract_http_error_details(e)
-            _set_last_api_error(status=status, reason=reason, message=message, context='subscriptions')
+            set_last_api_error(status=status, reason=reason, message=message, context='subscriptions')
             logging.error(f'An HTTP error {e.resp.status} occurred while fetching subscriptions page {page_count}: {e.content}')
-            return None
+            yield None
+            return
         except Exception as e:
             logging.error(f"An unexpected error occurred while fetching subscriptions page {page_count}: {e}")
-            return None
+            yield None
+            return
+
+        page = []
+        for item in response.get('items', []):
+            snippet = item.get('snippet', {})
+            channel_id = snippet.get('resourceId', {}).get('channelId')
+            title = snippet.get('title')
+            thumbnail_url = snippet.get('thumbnails', {}).get('default', {}).get('url')
+
+            if channel_id and title:
+                page.append({
+                    'channel_id': channel_id,
+                    'title': title,
+                    'thumbnail_url': thumbnail_url
+                })
+        yield page
+
+        next_page_token = response.get('nextPageToken')
+        if not next_page_token:
+            logging.info(f"Fetched subscriptions across {page_count} pages.")
+            return
+
+    message = f"Stopped fetching subscriptions after {max_pages} pages; the list is incomplete."
+    set_last_api_error(message=message, context='subscriptions')
+    logging.warning(message)
+    yield None
 
-    if page_count >= max_pages:
-        logging.warning(f"Stopped fetching subscriptions after {max_pages} pages. Potential issue?")
 
-    logging.info(f"Fetched {len(subscriptions)} subscriptions across {page_count} pages.")
+def get_all_subscriptions(youtube_service):
+    """Fetches all subscribed channels for the authenticated user."""
+    subscriptions = []
+    for page in iter_subscription_pages(youtube_service):
+        if page is None:
+            return None
+        subscriptions.extend(page)
+
+    logging.info(f"Fetched {len(subscriptions)} subscriptions.")
     return subscriptions
 
 
@@ -225,7 +414,7 @@ def get_my_channel_info(youtube_service):
             mine=True,
             maxResults=1
         )
-        response = request.execute()
+        response = _execute_request(request)
 
         items = response.get('items', [])
         if items:
@@ -237,7 +426,7 @@ def get_my_channel_info(youtube_service):
         return None
     except HttpError as e:
         status, reason, message = _extract_http_error_details(e)
-        _set_last_api_error(status=status, reason=reason, message=message, context='channel_info')
+        set_last_api_error(status=status, reason=reason, message=message, context='channel_info')
         logging.error(f'An HTTP error {e.resp.status} occurred fetching user channel info: {e.content}')
         return None
     except Exception as e:
@@ -249,57 +438,106 @@ def _format_duration(duration_iso):
     if not duration_iso:
         return None
 
-    match = re.match(r'^PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?$', duration_iso)
+    match = re.match(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$', duration_iso)
     if not match:
         return None
 
-    hours = int(match.group(1) or 0)
-    minutes = int(match.group(2) or 0)
-    seconds = int(match.group(3) or 0)
+    hours = int(match.group(1) or 0) * 24 + int(match.group(2) or 0)
+    minutes = int(match.group(3) or 0)
+    seconds = int(match.group(4) or 0)
 
+    # 'P0D' (streams without a recording, or not started yet) has nothing to show.
+    if hours == minutes == seconds == 0:
+        return None
     if hours > 0:
         return f"{hours}:{minutes:02d}:{seconds:02d}"
     return f"{minutes}:{seconds:02d}"
 
 
-def _load_video_durations(youtube_service, video_ids):
-    durations = {}
-    if not video_ids:
+def _is_video_details_pending(details):
+    # Keyed on the raw ISO value: a terminal 'P0D' or unparseable duration has no text but is final.
+    if details.get('live_broadcast_content') == UNAVAILABLE_BROADCAST_STATE:
+        return False
+    return details.get('live_broadcast_content') in PENDING_BROADCAST_STATES or not details.get('duration_iso')
+
+
+def _needs_video_details_fetch(details, now):
+    if not details:
+        return True
+    if not _is_video_details_pending(details):
+        return False
+    try:
+        fetched_at = datetime.fromisoformat(details['fetched_at'].replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return True
+    return (now - fetched_at).total_seconds() >= PENDING_VIDEO_DETAILS_TTL_SECONDS
+
+
+def load_video_durations(youtube_service, video_ids):
+    """Returns video_id -> duration text, asking the API only for IDs not cached in `video_details`."""
+    cached_details = db.get_video_details(video_ids)
+    now = datetime.now(timezone.utc)
+    durations = {vid: details.get('duration_text') for vid, details in cached_details.items()}
+    missing_ids = [vid for vid in video_ids if _needs_video_details_fetch(cached_details.get(vid), now)]
+    if not missing_ids:
         return durations
 
-    for start in range(0, len(video_ids), 50):
-        chunk = video_ids[start:start + 50]
+    fetched_at = utc_now_iso()
+    fetched_details = []
+    for start in range(0, len(missing_ids), 50):
+        chunk = missing_ids[start:start + 50]
         try:
-            response = youtube_service.videos().list(
-                part="contentDetails",
+            response = _execute_request(youtube_service.videos().list(
+                part="snippet,contentDetails",
                 id=','.join(chunk),
                 maxResults=50
-            ).execute()
+            ))
+            returned_ids = set()
             for item in response.get('items', []):
                 vid = item.get('id')
+                returned_ids.add(vid)
                 iso_duration = item.get('contentDetails', {}).get('duration')
                 durations[vid] = _format_duration(iso_duration)
+                fetched_details.append({
+                    'video_id': vid,
+                    'duration_iso': iso_duration,
+                    'duration_text': durations[vid],
+                    'live_broadcast_content': item.get('snippet', {}).get('liveBroadcastContent'),
+                    'fetched_at': fetched_at
+                })
+            fetched_details.extend({
+                'video_id': vid,
+                'duration_iso': None,
+                'duration_text': None,
+                'live_broadcast_content': UNAVAILABLE_BROADCAST_STATE,
+                'fetched_at': fetched_at
+            } for vid in chunk if vid not in returned_ids)
         except Exception as e:
             logging.warning(f"Could not fetch video durations for chunk: {e}")
 
+    db.upsert_video_details(fetched_details)
     return durations
 
 
-def get_new_videos_for_channel(youtube_service, channel_id, channel_title, published_after=None, max_pages=3):
+def get_new_videos_for_channel(youtube_service, channel_id, channel_title, published_after=None, max_pages=3,
+                               upload_history=None):
     """Fetches newest videos for a given channel, optionally after a timestamp.
 
-    Uses channel uploads playlist instead of `search.list` to keep quota usage low.
+    Uses channel uploads playlist instead of `search.list` to keep quota usage low, and
+    stops paging once a page reaches videos published before `published_after`.
+    If `upload_history` is a list, the publish time of every item fetched (new or not)
+    is appended to it, so callers can learn the channel's upload cadence.
     """
     if not youtube_service:
         return None
 
     try:
         clear_last_api_error()
-        channel_response = youtube_service.channels().list(
+        channel_response = _execute_request(youtube_service.channels().list(
             part="contentDetails",
             id=channel_id,
             maxResults=1
-        ).execute()
+        ))
         channel_items = channel_response.get('items', [])
         if not channel_items:
             return []
@@ -313,7 +551,7 @@ def get_new_videos_for_channel(youtube_service, channel_id, channel_title, publi
             return []
     except HttpError as e:
         status, reason, message = _extract_http_error_details(e)
-        _set_last_api_error(status=status, reason=reason, message=message, context='favorite_videos')
+        set_last_api_error(status=status, reason=reason, message=message, context='favorite_videos')
         logging.error(f"YouTube API error fetching uploads playlist for {channel_id}: {e}")
         return None
     except Exception as e:
@@ -335,11 +573,12 @@ def get_new_videos_for_channel(youtube_service, channel_id, channel_title, publi
             if page_token:
                 request_params["pageToken"] = page_token
 
-            response = youtube_service.playlistItems().list(**request_params).execute()
+            response = _execute_request(youtube_service.playlistItems().list(**request_params))
             items = response.get('items', [])
             if not items:
                 break
 
+            reached_known_videos = False
             for item in items:
                 snippet = item.get('snippet', {})
                 content_details = item.get('contentDetails', {})
@@ -347,7 +586,10 @@ def get_new_videos_for_channel(youtube_service, channel_id, channel_title, publi
                 published_at = content_details.get('videoPublishedAt') or snippet.get('publishedAt')
                 if not video_id:
                     continue
+                if upload_history is not None and published_at:
+                    upload_history.append(published_at)
                 if published_after and published_at and published_at <= published_after:
+                    reached_known_videos = True
                     continue
 
                 videos.append({
@@ -362,18 +604,19 @@ def get_new_videos_for_channel(youtube_service, channel_id, channel_title, publi
                 })
 
             page_token = response.get('nextPageToken')
-            if not page_token:
+            # The uploads playlist is newest first: later pages only hold older videos.
+            if not page_token or reached_known_videos:
                 break
         except HttpError as e:
             status, reason, message = _extract_http_error_details(e)
-            _set_last_api_error(status=status, reason=reason, message=message, context='favorite_videos')
+            set_last_api_error(status=status, reason=reason, message=message, context='favorite_videos')
             logging.error(f"YouTube API error fetching videos for {channel_id}: {e}")
             return None
         except Exception as e:
             logging.error(f"Unexpected error fetching videos for {channel_id}: {e}")
             return None
 
-    duration_map = _load_video_durations(youtube_service, [video['video_id'] for video in videos])
+    duration_map = load_video_durations(youtube_service, [video['video_id'] for video in videos])
     for video in videos:
         video['duration_text'] = duration_map.get(video['video_id'])
 
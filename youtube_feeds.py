@@ -0,0 +1,101 @@
+"""Quota-free discovery of new uploads through YouTube's public Atom feeds.
+
+Each channel publishes its latest uploads (about 15) at
+https://www.youtube.com/feeds/videos.xml?channel_id=<id>. Reading it costs no Data
+API quota; the API is only called for durations of videos not already in
+`video_details`. Set YOUTUBE_FEED_URL_TEMPLATE to point at a local stand-in
+(e.g. http://127.0.0.1:8000/{channel_id}.xml or file:///tmp/feeds/{channel_id}.xml).
+"""
+import logging
+import os
+import urllib.error
+import urllib.request
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+import youtube_api as yt
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+YOUTUBE_FEED_URL_TEMPLATE = os.environ.get(
+    'YOUTUBE_FEED_URL_TEMPLATE',
+    'https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}'
+)
+FEED_FETCH_TIMEOUT_SECONDS = 10
+
+_ATOM = '{http://www.w3.org/2005/Atom}'
+_YT = '{http://www.youtube.com/xml/schemas/2015}'
+_MEDIA = '{http://search.yahoo.com/mrss/}'
+
+
+def _normalize_timestamp(value):
+    """Feed timestamps use +00:00 offsets; the API (and everything we store) uses ...Z."""
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return value
+    return moment.astimezone(timezone.utc).replace(microsecond=0).isoformat().replace('+00:00', 'Z')
+
+
+def iter_feed_entries(stream):
+    """Yields one dict per <entry> of an uploads feed, parsing incrementally and discarding each entry."""
+    for _, element in ET.iterparse(stream, events=('end',)):
+        if element.tag != f'{_ATOM}entry':
+            continue
+        video_id = element.findtext(f'{_YT}videoId')
+        thumbnail = element.find(f'{_MEDIA}group/{_MEDIA}thumbnail')
+        link = element.find(f"{_ATOM}link[@rel='alternate']")
+        entry = {
+            'video_id': video_id,
+            'title': element.findtext(f'{_ATOM}title') or 'Untitled',
+            'published_at': _normalize_timestamp(element.findtext(f'{_ATOM}published')),
+            'thumbnail_url': thumbnail.get('url') if thumbnail is not None else None,
+            'video_url': link.get('href') if link is not None else f"https://www.youtube.com/watch?v={video_id}"
+        }
+        element.clear()
+        if video_id:
+            yield entry
+
+
+def get_new_videos_for_channel(youtube_service, channel_id, channel_title, published_after=None, max_pages=None,
+                               upload_history=None):
+    """Same contract as `youtube_api.get_new_videos_for_channel`, but discovers uploads from the Atom feed.
+
+    Only the newest ~15 uploads are visible, so a channel with more uploads than that
+    since `published_after` will miss the older ones. `max_pages` is accepted for
+    signature compatibility and ignored.
+    """
+    url = YOUTUBE_FEED_URL_TEMPLATE.format(channel_id=channel_id)
+    videos = []
+    try:
+        yt.clear_last_api_error()
+        with urllib.request.urlopen(url, timeout=FEED_FETCH_TIMEOUT_SECONDS) as response:
+            for entry in iter_feed_entries(response):
+                if upload_history is not None and entry['published_at']:
+                    upload_history.append(entry['published_at'])
+                if published_after and entry['published_at'] and entry['published_at'] <= published_after:
+                    continue
+                videos.append({
+                    "channel_id": channel_id,
+                    "channel_title": channel_title,
+                    "duration_text": None,
+                    **entry
+                })
+    except urllib.error.HTTPError as e:
+        yt.set_last_api_error(status=e.code, reason='feedError', message=f"No se pudo leer el feed de videos del canal (HTTP {e.code}).", context='favorite_videos')
+        logging.error(f"Feed error fetching videos for {channel_id}: HTTP {e.code}")
+        return None
+    except (urllib.error.URLError, ET.ParseError, OSError) as e:
+        yt.set_last_api_error(
+            reason='feedError', message=f"No se pudo leer el feed de videos del canal ({e}).", context='favorite_videos'
+        )
+        logging.error(f"Feed error fetching videos for {channel_id}: {e}")
+        return None
+
+    if videos and youtube_service:
+        duration_map = yt.load_video_durations(youtube_service, [video['video_id'] for video in videos])
+        for video in videos:
+            video['duration_text'] = duration_map.get(video['video_id'])
+
+    videos.sort(key=lambda video: video.get('published_at') or '', reverse=True)
+    return videos